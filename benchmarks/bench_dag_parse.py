@@ -0,0 +1,71 @@
+"""Parse time of the DAG file, the way the Airflow scheduler sees it.
+
+Cold parses run the DAG file in a fresh interpreter each time (one DAG file
+processor per parse); warm parses re-run it in the same interpreter, where
+modules imported by an earlier parse are already cached. Also lists which heavy
+libraries the parse pulls in. Pass --dag to time another revision of the file:
+
+    git show HEAD~1:dags/ETL_Capstone-Project-Plantopia.py > /tmp/old_dag.py
+    python benchmarks/bench_dag_parse.py --repeat 10
+    python benchmarks/bench_dag_parse.py --repeat 10 --dag /tmp/old_dag.py
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from common import DAG_FILE, print_table
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'sqlalchemy', 'google.cloud.bigquery']
+
+PARSE_SCRIPT = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('plantopia_dag', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+cold = (time.perf_counter() - start) * 1000
+warm = []
+for _ in range(int(sys.argv[2])):
+    start = time.perf_counter()
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+    warm.append((time.perf_counter() - start) * 1000)
+print(json.dumps({'cold': cold, 'warm': warm, 'modules': [name for name in json.loads(sys.argv[3]) if name in sys.modules]}))
+"""
+
+
+def parse_once(dag_file, warm_repeat):
+    output = subprocess.run(
+        [sys.executable, '-c', PARSE_SCRIPT, dag_file, str(warm_repeat), json.dumps(HEAVY_MODULES)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dag', default=DAG_FILE, help='DAG file to parse (default: the DAG in this repo)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of cold parses, each in a new interpreter')
+    parser.add_argument('--warm-repeat', type=int, default=5, help='warm parses per interpreter')
+    args = parser.parse_args()
+
+    cold = []
+    warm = []
+    modules = []
+    for _ in range(args.repeat):
+        result = parse_once(args.dag, args.warm_repeat)
+        cold.append(result['cold'])
+        warm.extend(result['warm'])
+        modules = result['modules']
+
+    rows = []
+    for name, timings in [('cold', cold), ('warm', warm)]:
+        if timings:
+            rows.append([name, len(timings), f"{min(timings):.1f}", f"{statistics.median(timings):.1f}", f"{max(timings):.1f}"])
+    print_table(['parse', 'runs', 'best ms', 'median ms', 'worst ms'], rows)
+    print(f"heavy modules imported while parsing: {', '.join(modules) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
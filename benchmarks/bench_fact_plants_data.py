@@ -0,0 +1,82 @@
+"""Row count and build time of fact_plants_data as plants and per-plant rows grow.
+
+Compares the previous chained merge on plant_id (a cartesian product of every
+per-plant dimension) with the per-dimension bridge built by
+build_fact_plants_data. The legacy build is skipped once its output would
+exceed --legacy-max-rows.
+
+    python benchmarks/bench_fact_plants_data.py --plants 24 1000 10000 --per-plant 1 3 10
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import load_pipeline, print_table
+
+
+def make_inputs(plants, per_plant, seed=0):
+    rng = np.random.default_rng(seed)
+    plant_ids = pd.DataFrame({'plant_id': np.arange(1, plants + 1)})
+
+    def per_plant_rows(id_column, rows_per_plant):
+        plant_id = np.repeat(plant_ids['plant_id'].to_numpy(), rows_per_plant)
+        return pd.DataFrame({id_column: np.arange(1, len(plant_id) + 1), 'plant_id': rng.permutation(plant_id)})
+
+    return {
+        'plant_ids': plant_ids,
+        'watering_reminders': per_plant_rows('watering_reminders_id', 1),
+        'plant_faqs': per_plant_rows('plant_faqs_id', per_plant),
+        'plant_instructions': per_plant_rows('plant_instruction_id', per_plant),
+        'plant_characteristics': per_plant_rows('plant_characteristic_id', 1),
+    }
+
+
+def legacy_fact_plants_data(plant_ids, watering_reminders, plant_faqs, plant_instructions, plant_characteristics):
+    # Rantai merge sebelum bridge per dimensi (lihat riwayat transform_task)
+    df = pd.merge(watering_reminders, plant_ids, on='plant_id')[['plant_id', 'watering_reminders_id']]
+    df = pd.merge(plant_faqs, df, on='plant_id')[['plant_id', 'plant_faqs_id', 'watering_reminders_id']]
+    df = pd.merge(plant_instructions, df, on='plant_id')[['plant_id', 'plant_faqs_id', 'plant_instruction_id', 'watering_reminders_id']]
+    df = pd.merge(plant_characteristics, df, on='plant_id')
+    return df[['plant_id', 'plant_faqs_id', 'plant_characteristic_id', 'plant_instruction_id', 'watering_reminders_id']]
+
+
+def timed(func, inputs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(**inputs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(result), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plants', type=int, nargs='+', default=[24, 100, 1000, 10000])
+    parser.add_argument('--per-plant', type=int, nargs='+', default=[1, 3, 10],
+                        help='FAQs and instructions per plant')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max-rows', type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    pipeline = load_pipeline()
+    rows = []
+    for plants in args.plants:
+        for per_plant in args.per_plant:
+            inputs = make_inputs(plants, per_plant)
+            bridge_rows, bridge_time = timed(pipeline.build_fact_plants_data, inputs, args.repeat)
+            expected_legacy_rows = plants * per_plant * per_plant
+            if expected_legacy_rows <= args.legacy_max_rows:
+                legacy_rows, legacy_time = timed(legacy_fact_plants_data, inputs, args.repeat)
+                legacy_time = f"{legacy_time * 1000:.1f}"
+            else:
+                legacy_rows, legacy_time = expected_legacy_rows, 'skipped'
+            rows.append([plants, per_plant, legacy_rows, legacy_time, bridge_rows, f"{bridge_time * 1000:.1f}"])
+
+    print_table(['plants', 'faqs/instr per plant', 'legacy rows', 'legacy ms', 'bridge rows', 'bridge ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Offline latency of the BigQuery load path with a stand-in client.
+
+Runs load_to_bigquery for every staged file in the load directory against a
+local stand-in client that only reads the file and simulates job latency, then
+reports per-table wall-clock time and how many clients were created. With
+--bulk the same files are also loaded through load_all_to_bigquery, which
+submits every job at once and polls them together. Pipeline state goes to a
+temporary directory and every load is forced, so repeats time the load path
+instead of the skip for an unchanged file.
+
+    python benchmarks/bench_load_path.py --dir /path/to/data_source_to_load --latency-ms 0 --repeat 3 --bulk
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import StandInClient, load_pipeline, print_table, use_workdir
+
+
+def time_loads(pipeline, load_dir, args):
+    rows = []
+    total = 0.0
+    for filename in sorted(os.listdir(load_dir)):
+        if not filename.endswith(pipeline.STAGING_EXTENSIONS[pipeline.STAGING_FORMAT]):
+            continue
+        table_name = os.path.splitext(filename)[0]
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pipeline.load_to_bigquery(os.path.join(load_dir, filename), table_name)
+            timings.append(time.perf_counter() - start)
+        total += sum(timings)
+        rows.append([table_name, f"{min(timings) * 1000:.2f}", f"{max(timings) * 1000:.2f}"])
+
+    print_table(['table', 'best ms', 'worst ms'], rows)
+    print(f"total load wall-clock: {total * 1000:.1f} ms, clients created: {StandInClient.created}")
+
+    if args.bulk:
+        pipeline.LOAD_POLL_INTERVAL = min(pipeline.LOAD_POLL_INTERVAL, args.latency_ms / 1000 or 0.01)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pipeline.load_all_to_bigquery(load_dir)
+            timings.append(time.perf_counter() - start)
+        print(f"bulk load wall-clock: best {min(timings) * 1000:.1f} ms, worst {max(timings) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', help='directory with staged load files (default: FINAL_DIR of the DAG)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated server-side job latency')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--bulk', action='store_true', help='also time the consolidated bulk load')
+    args = parser.parse_args()
+
+    os.environ.setdefault('PROJECT_ID', 'local')
+    os.environ.setdefault('DATASET_ID', 'benchmark')
+    pipeline = load_pipeline()
+    pipeline.set_bigquery_client_factory(lambda: StandInClient(args.latency_ms / 1000))
+    load_dir = args.dir or pipeline.FINAL_DIR
+    with tempfile.TemporaryDirectory(prefix='plantopia_bench_') as workdir:
+        # Fingerprint dan metrik ditulis ke direktori sementara, dan fingerprint load diabaikan
+        use_workdir(pipeline, workdir)
+        pipeline.FORCE_REFRESH = ['all']
+        time_loads(pipeline, load_dir, args)
+
+
+if __name__ == '__main__':
+    main()
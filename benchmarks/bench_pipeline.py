@@ -0,0 +1,223 @@
+"""Time and memory of extract, transform and load on synthetic data.
+
+For every scale factor, generates synthetic source tables with
+synthetic_data.py and runs the pipeline on them in a temporary directory:
+extract_task from SQLite (--source sqlite) or from a folder of CSV files
+(--source csv, which includes copying the folder into SQLite), then
+transform_task, then load_all_to_bigquery against a stand-in BigQuery client
+or, with --sink duckdb, into a DuckDB file. Each scale runs in
+its own interpreter, so memory numbers of a scale do not include the earlier
+ones. Peak RSS is sampled every 10 ms while a stage runs; rows are the rows
+written by the stage. Save a run and compare a later one to catch regressions
+(exit status 1 when a stage got slower than --tolerance). Pipeline settings
+read from the environment (SETTINGS below, e.g. SQL_PUSHDOWN or
+STAGING_FORMAT) are saved with each run, and only runs with the same settings
+are compared:
+
+    python benchmarks/bench_pipeline.py --scale 1 100 --save /tmp/pipeline_before.json
+    python benchmarks/bench_pipeline.py --scale 1 100 --compare /tmp/pipeline_before.json --tolerance 0.25
+    python benchmarks/bench_pipeline.py --scale 10000 --source csv
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import StandInClient, load_pipeline, print_table, use_workdir
+
+STAGES = [
+    ('extract', 'extract_task.jsonl'),
+    ('transform', 'transform_task.jsonl'),
+    ('load', 'load_all_to_bigquery.jsonl'),
+]
+# Konfigurasi DAG dari environment yang mengubah kinerja; disimpan di hasil dan menjadi bagian kunci --compare
+SETTINGS = ['SQL_PUSHDOWN', 'STAGING_FORMAT', 'EXTRACT_MODE', 'EXTRACT_CHUNK_SIZE', 'EXTRACT_PARALLELISM', 'CHANGE_PROBE',
+            'CATEGORY_MAX_RATIO', 'LOAD_MODE', 'LOAD_PARALLELISM', 'LOAD_STRATEGY']
+
+
+class PeakRss:
+    # Sampler RSS di thread terpisah, karena satu tahap bisa naik-turun jauh di antara dua titik ukur
+    def __init__(self, pipeline, interval=0.01):
+        self.pipeline = pipeline
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.pipeline.current_rss() or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.pipeline.current_rss() or 0)
+
+
+def stage_rows(pipeline, metrics_file, stage):
+    path = os.path.join(pipeline.METRICS_DIR, metrics_file)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        metrics = [json.loads(line) for line in f]
+    return sum(metric['rows_out'] or 0 for metric in metrics if metric['stage'] == stage)
+
+
+def task_callable(task):
+    # Di modul DAG, extract_task dan transform_task sudah diganti dengan PythonOperator-nya
+    return getattr(task, 'python_callable', task)
+
+
+def run_scale(scale, source, sink, seed, workdir, log_path):
+    # Library yang diimpor DAG di dalam task dimuat lebih dulu, sehingga waktu tahap tidak termasuk biaya import
+    import pyarrow.parquet  # noqa: F401
+    import sqlalchemy  # noqa: F401
+
+    import synthetic_data
+
+    pipeline = load_pipeline()
+    use_workdir(pipeline, workdir)
+    if sink == 'duckdb':
+        pipeline.set_bigquery_client_factory(lambda: pipeline.DuckDBClient(os.path.join(workdir, 'sink.duckdb')))
+    else:
+        pipeline.set_bigquery_client_factory(StandInClient)
+
+    start = time.perf_counter()
+    tables = synthetic_data.generate_tables(scale, seed, pipeline)
+    source_rows = sum(len(df) for df in tables.values())
+    source_db = os.path.join(workdir, 'source.db')
+    csv_dir = os.path.join(workdir, 'source_csv')
+    if source == 'csv':
+        synthetic_data.write_csv_dir(tables, csv_dir)
+    else:
+        synthetic_data.write_sqlite(tables, source_db)
+    del tables
+    generate_seconds = time.perf_counter() - start
+
+    pipeline.SOURCE = source
+    pipeline.SOURCE_PATH = csv_dir if source == 'csv' else source_db
+    pipeline.CSV_SOURCE_DB = os.path.join(workdir, 'csv_source.sqlite')
+    steps = {
+        'extract': task_callable(pipeline.extract_task),
+        'transform': task_callable(pipeline.transform_task),
+        'load': lambda: pipeline.load_all_to_bigquery(pipeline.FINAL_DIR),
+    }
+    results = []
+    with open(log_path, 'a') as log, contextlib.redirect_stdout(log):
+        for stage, metrics_file in STAGES:
+            rss_start = pipeline.current_rss() or 0
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            with PeakRss(pipeline) as peak:
+                steps[stage]()
+            results.append({
+                'stage': stage,
+                'rows': stage_rows(pipeline, metrics_file, stage),
+                'wall_seconds': time.perf_counter() - wall_start,
+                'cpu_seconds': time.process_time() - cpu_start,
+                'rss_delta_bytes': (pipeline.current_rss() or 0) - rss_start,
+                'peak_rss_bytes': peak.peak,
+            })
+    return {'scale': scale, 'source': source, 'sink': sink,
+            'settings': {name: getattr(pipeline, name) for name in SETTINGS}, 'source_rows': source_rows,
+            'generate_seconds': generate_seconds, 'stages': results}
+
+
+def run_worker(args):
+    with tempfile.TemporaryDirectory(prefix='plantopia_bench_') as workdir:
+        result = run_scale(args.worker_scale, args.source, args.sink, args.seed, workdir,
+                           args.log or os.path.join(workdir, 'pipeline.log'))
+    print(json.dumps(result))
+
+
+def run_in_interpreter(scale, args):
+    command = [sys.executable, os.path.abspath(__file__), '--worker-scale', str(scale),
+               '--source', args.source, '--sink', args.sink, '--seed', str(args.seed)]
+    if args.log:
+        command += ['--log', args.log]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_key(run):
+    # Hasil lama tanpa 'settings' tidak cocok dengan run mana pun, karena mode pipeline-nya tidak diketahui
+    settings = run.get('settings')
+    return (run['scale'], run['source'], run.get('sink', 'stand-in'),
+            None if settings is None else json.dumps(settings, sort_keys=True))
+
+
+def compare(results, baseline, tolerance):
+    # Regresi jika wall time tahap yang sama pada skala, sumber, sink dan settings yang sama melebihi baseline * (1 + tolerance)
+    previous = {run_key(run) + (stage['stage'],): stage for run in baseline for stage in run['stages']}
+    baseline_settings = {run_key(run)[:3]: run.get('settings') for run in baseline}
+    rows = []
+    regressions = 0
+    for run in results:
+        if not any(run_key(run) + (stage['stage'],) in previous for stage in run['stages']):
+            before = baseline_settings.get(run_key(run)[:3]) or {}
+            changed = {name: (before.get(name), value) for name, value in run['settings'].items() if before.get(name) != value}
+            print(f"scale {run['scale']}: no baseline with the same source, sink and settings, not compared "
+                  f"(baseline -> this run: {changed})")
+            continue
+        for stage in run['stages']:
+            before = previous.get(run_key(run) + (stage['stage'],))
+            if before is None:
+                continue
+            ratio = stage['wall_seconds'] / before['wall_seconds'] if before['wall_seconds'] else float('inf')
+            regressed = ratio > 1 + tolerance
+            regressions += regressed
+            rows.append([run['scale'], stage['stage'], f"{before['wall_seconds']:.3f}", f"{stage['wall_seconds']:.3f}",
+                         f"{ratio:.2f}x", f"{before['peak_rss_bytes'] / 2**20:.0f}", f"{stage['peak_rss_bytes'] / 2**20:.0f}",
+                         'REGRESSION' if regressed else 'ok'])
+    print_table(['scale', 'stage', 'before s', 'after s', 'ratio', 'before peak MB', 'after peak MB', 'result'], rows)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 100], help='scale factors, e.g. 1 100 10000')
+    parser.add_argument('--source', choices=['sqlite', 'csv'], default='sqlite')
+    parser.add_argument('--sink', choices=['stand-in', 'duckdb'], default='stand-in')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', help='append pipeline output to this file instead of discarding it')
+    parser.add_argument('--save', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON file from an earlier --save to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown per stage, 0.25 = 25%%')
+    parser.add_argument('--worker-scale', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_scale is not None:
+        run_worker(args)
+        return
+
+    results = [run_in_interpreter(scale, args) for scale in args.scale]
+    rows = []
+    for run in results:
+        for stage in run['stages']:
+            rows.append([run['scale'], run['source_rows'], stage['stage'], stage['rows'], f"{stage['wall_seconds']:.3f}",
+                         f"{stage['cpu_seconds']:.3f}", f"{stage['rss_delta_bytes'] / 2**20:+.1f}",
+                         f"{stage['peak_rss_bytes'] / 2**20:.0f}"])
+    print_table(['scale', 'source rows', 'stage', 'rows out', 'wall s', 'cpu s', 'RSS delta MB', 'peak RSS MB'], rows)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Schema-faithful synthetic copies of every source table at a scale factor.
+
+Each table gets (rows in data_source_csv, at least 1) x scale rows with the
+columns of SOURCE_SCHEMAS in the DAG. Ids are 1..n per table and foreign key
+columns point at ids that exist in the parent table. Every other column is
+sampled from the real values of that column, so text lengths, HTML, NULLs and
+plant name spellings keep the same distribution; columns of empty tables are
+generated from their registry type. Write a scale to a CSV folder and/or a
+SQLite file:
+
+    python benchmarks/synthetic_data.py --scale 100 --csv-dir /tmp/synthetic_csv --sqlite /tmp/synthetic.db
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import REAL_DATA_DIR, load_pipeline
+
+FOREIGN_KEYS = {
+    'user_id': 'users',
+    'plant_id': 'plants',
+    'my_plant_id': 'user_plants',
+    'plant_category_id': 'plant_categories',
+    'plant_characteristic_id': 'plant_characteristics',
+    'instruction_category_id': 'plant_instruction_categories',
+}
+
+
+def read_real_tables(data_dir=REAL_DATA_DIR):
+    tables = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith('.csv'):
+            tables[filename[:-len('.csv')]] = pd.read_csv(os.path.join(data_dir, filename))
+    return tables
+
+
+def generated_values(column_type, column, rows, rng):
+    # Kolom tabel kosong tidak punya contoh nilai, jadi dibuat dari tipe registry
+    if column_type == 'int64':
+        return rng.integers(0, 100, rows)
+    if column_type == 'float64':
+        return rng.random(rows) * 100
+    if column_type == 'bool':
+        return rng.integers(0, 2, rows)
+    if column_type == 'datetime':
+        start = pd.Timestamp('2024-01-01').value
+        return pd.to_datetime(rng.integers(start, start + 365 * 86_400 * 10**9, rows)).strftime('%Y-%m-%d %H:%M:%S.%f')
+    return np.char.add(f"{column} ", np.arange(1, rows + 1).astype(str))
+
+
+def table_rows(real_tables, table, scale):
+    return max(len(real_tables.get(table, ())), 1) * scale
+
+
+def generate_table(table, schema, real_tables, scale, rng):
+    rows = table_rows(real_tables, table, scale)
+    real = real_tables.get(table)
+    data = {}
+    for column, column_type in schema['columns'].items():
+        if column == 'id':
+            data[column] = np.arange(1, rows + 1)
+        elif column in FOREIGN_KEYS:
+            data[column] = rng.integers(1, table_rows(real_tables, FOREIGN_KEYS[column], scale) + 1, rows)
+        elif real is not None and column in real.columns and len(real):
+            data[column] = real[column].to_numpy()[rng.integers(0, len(real), rows)]
+        else:
+            data[column] = generated_values(column_type, column, rows, rng)
+    return pd.DataFrame(data)
+
+
+def generate_tables(scale, seed=0, pipeline=None):
+    pipeline = pipeline or load_pipeline()
+    rng = np.random.default_rng(seed)
+    real_tables = read_real_tables()
+    return {table: generate_table(table, schema, real_tables, scale, rng)
+            for table, schema in pipeline.SOURCE_SCHEMAS.items()}
+
+
+def write_csv_dir(tables, directory):
+    os.makedirs(directory, exist_ok=True)
+    for table, df in tables.items():
+        df.to_csv(os.path.join(directory, f"{table}.csv"), index=False)
+
+
+def write_sqlite(tables, path):
+    if os.path.exists(path):
+        os.remove(path)
+    with sqlite3.connect(path) as connection:
+        for table, df in tables.items():
+            df.to_sql(table, connection, index=False, chunksize=50_000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv-dir', help='write one CSV file per table to this folder')
+    parser.add_argument('--sqlite', help='write every table to this SQLite file')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables = generate_tables(args.scale, args.seed)
+    if args.csv_dir:
+        write_csv_dir(tables, args.csv_dir)
+    if args.sqlite:
+        write_sqlite(tables, args.sqlite)
+    print(f"{sum(len(df) for df in tables.values())} rows in {len(tables)} tables, "
+          f"scale {args.scale}, {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,234 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.utils.dates import days_ago
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine, inspect
-from google.cloud import bigquery
-from google.oauth2 import service_account
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import os
-import pandas as pd
+import shutil
+import json
+import time
+import threading
+import importlib
+import hashlib
+import functools
+import contextlib
 import re
 import html
 
 # Load environment variables
 load_dotenv()
 
+# Direktori kerja pipeline; PIPELINE_BASE_DIR memindahkan semua file staging dan state, misalnya untuk mode lokal
+BASE_DIR = os.getenv('PIPELINE_BASE_DIR', "/home/newrey/airflow/Capstone-Project-Plantopia")
+OUTPUT_DIR = os.path.join(BASE_DIR, "data_source_csv")
+DIM_DIR = os.path.join(BASE_DIR, "data_source_dimensional")
+FINAL_DIR = os.path.join(BASE_DIR, "data_source_to_load")
+STATE_DIR = os.path.join(BASE_DIR, "state")
+WATERMARK_FILE = os.path.join(STATE_DIR, "watermarks.json")
+LOAD_STATE_DIR = os.path.join(STATE_DIR, "load_hashes")
+FINGERPRINT_DIR = os.path.join(STATE_DIR, "fingerprints")
+METRICS_DIR = os.path.join(STATE_DIR, "metrics")
+CSV_SOURCE_DB = os.path.join(STATE_DIR, "csv_source.sqlite")
+
+# Sumber data: 'mysql' (koneksi DB_* dari .env), 'sqlite' (SOURCE_PATH = file SQLite) atau
+# 'csv' (SOURCE_PATH = folder berisi satu file CSV per tabel, seperti data_source_csv)
+SOURCE = os.getenv('SOURCE', 'mysql')
+SOURCE_PATH = os.getenv('SOURCE_PATH', '')
+# Tujuan load: 'bigquery' atau 'duckdb' (file DUCKDB_PATH, untuk menjalankan pipeline tanpa GCP)
+SINK = os.getenv('SINK', 'bigquery')
+DUCKDB_PATH = os.getenv('DUCKDB_PATH', os.path.join(BASE_DIR, "plantopia.duckdb"))
+
+# Mode ekstraksi: 'full' (SELECT * setiap run) atau 'incremental' (berdasarkan watermark)
+EXTRACT_MODE = os.getenv('EXTRACT_MODE', 'full')
+# Tabel yang hanya bertambah dan aman diekstrak secara incremental
+INCREMENTAL_TABLES = os.getenv('INCREMENTAL_TABLES', 'notifications,watering_histories,user_plant_histories').split(',')
+# Urutan prioritas kolom watermark, updated_at juga menangkap baris yang berubah
+WATERMARK_COLUMNS = ['updated_at', 'id']
+# Jumlah baris per chunk saat membaca tabel dengan server-side cursor
+EXTRACT_CHUNK_SIZE = int(os.getenv('EXTRACT_CHUNK_SIZE', 50000))
+# Jumlah tabel yang diekstrak bersamaan, 1 = berurutan
+EXTRACT_PARALLELISM = int(os.getenv('EXTRACT_PARALLELISM', 1))
+# Pemeriksaan perubahan sebelum ekstraksi: 'off', 'checksum' (CHECKSUM TABLE), 'information_schema'
+# (UPDATE_TIME dan TABLE_ROWS) atau 'stats' (COUNT(*), MAX(updated_at) dan MAX(id))
+CHANGE_PROBE = os.getenv('CHANGE_PROBE', 'off')
+# SQL pushdown: 'off' (transformasi dengan merge pandas) atau 'duckdb' (setiap tabel target adalah query di
+# PUSHDOWN_STEPS yang dijalankan DuckDB di atas file staging; extract hanya mengambil kolom yang dipakai query)
+SQL_PUSHDOWN = os.getenv('SQL_PUSHDOWN', 'off')
+# Format file staging antar tahap: 'parquet', 'feather' (Arrow IPC) atau 'csv'
+STAGING_FORMAT = os.getenv('STAGING_FORMAT', 'parquet')
+STAGING_EXTENSIONS = {'parquet': '.parquet', 'feather': '.arrow', 'csv': '.csv'}
+# Mode load: 'per_table' (satu task per tabel) atau 'bulk' (satu task untuk semua load job)
+LOAD_MODE = os.getenv('LOAD_MODE', 'per_table')
+# Jumlah upload file yang dikirim bersamaan dan jeda polling status job pada mode bulk
+LOAD_PARALLELISM = int(os.getenv('LOAD_PARALLELISM', 4))
+LOAD_POLL_INTERVAL = float(os.getenv('LOAD_POLL_INTERVAL', 1.0))
+# Strategi load: 'truncate' (tulis ulang seluruh tabel) atau 'merge' (hanya baris yang berubah)
+LOAD_STRATEGY = os.getenv('LOAD_STRATEGY', 'truncate')
+# Kolom kunci MERGE untuk tabel fact; tabel lain memakai kolom *_id pertama
+LOAD_KEYS = {
+    'fact_user_activities': ['activity_type', 'my_plant_id', 'planting_history_id', 'watering_history_id'],
+    'fact_plants_data': ['plant_id', 'dimension', 'watering_reminders_id', 'plant_faqs_id', 'plant_instruction_id', 'plant_characteristic_id'],
+}
+# Kolom kunci deduplikasi per tabel sumber; tabel lain dibandingkan per baris utuh. id adalah primary key
+# di MySQL, sehingga hasilnya sama dengan perbandingan baris utuh tetapi hanya satu kolom yang di-hash.
+DEDUP_KEYS = {
+    'notifications': ['id'],
+    'user_plants': ['id'],
+    'user_plant_histories': ['id'],
+    'watering_histories': ['id'],
+}
+# Layout tabel BigQuery: partisi waktu per hari pada created_at dan clustering sesuai filter dashboard
+TABLE_LAYOUTS = {
+    'dim_watering_histories': {'partition': 'created_at', 'cluster': ['user_name', 'plant_name']},
+    'dim_planting_histories': {'partition': 'created_at', 'cluster': ['user_name', 'plant_name']},
+    'dim_my_plants': {'partition': 'created_at', 'cluster': ['user_name', 'plant_name']},
+    'fact_user_activities': {'partition': 'created_at', 'cluster': ['user_id', 'plant_id']},
+}
+
+# Format tanggal di file CSV staging dan sumber teks
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# Perilaku saat kolom sumber berbeda dari registry: 'warn' (kolom tak dikenal dibuang) atau 'fail'
+SCHEMA_DRIFT = os.getenv('SCHEMA_DRIFT', 'warn')
+# Tipe logis registry beserta dtype pandas dan tipe kolom BigQuery
+# Integer dan boolean memakai dtype nullable pandas sehingga NULL tetap NULL, tanpa nilai pengganti 0/-1
+SCHEMA_TYPES = {
+    'int64': {'pandas': 'Int64', 'bigquery': 'INT64'},
+    'float64': {'pandas': 'float64', 'bigquery': 'FLOAT64'},
+    'bool': {'pandas': 'boolean', 'bigquery': 'BOOL'},
+    'string': {'pandas': 'category', 'bigquery': 'STRING'},
+    'datetime': {'pandas': 'datetime64[ns]', 'bigquery': 'TIMESTAMP'},
+}
+# Kolom teks disimpan sebagai category hanya jika rasio nilai unik terhadap jumlah baris tidak melebihi ini
+CATEGORY_MAX_RATIO = float(os.getenv('CATEGORY_MAX_RATIO', 0.5))
+# Schema tabel sumber MySQL: tipe setiap kolom setelah cleansing dan kolom yang tidak boleh NULL
+SOURCE_SCHEMAS = {
+    'admins': {'columns': {
+        'id': 'int64', 'name': 'string', 'email': 'string', 'password': 'string', 'url_image': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'articles': {'columns': {
+        'id': 'int64', 'title': 'string', 'content': 'string', 'image': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'customize_watering_reminders': {'columns': {
+        'id': 'int64', 'my_plant_id': 'int64', 'time': 'string', 'recurring': 'int64', 'type': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime', 'user_id': 'int64', 'plant_id': 'int64'}, 'required': ['id']},
+    'fertilizers': {'columns': {
+        'id': 'int64', 'name': 'string', 'compostition': 'string', 'create_at': 'datetime', 'plant_id': 'int64',
+        'updated_at': 'datetime'}, 'required': ['id']},
+    'notifications': {'columns': {
+        'id': 'int64', 'title': 'string', 'body': 'string', 'user_id': 'int64', 'is_read': 'bool',
+        'created_at': 'datetime', 'updated_at': 'datetime', 'plant_id': 'int64'}, 'required': ['id']},
+    'plant_categories': {'columns': {
+        'id': 'int64', 'name': 'string', 'image_url': 'string', 'created_at': 'datetime', 'updated_at': 'datetime'},
+        'required': ['id']},
+    'plant_characteristics': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'height': 'int64', 'height_unit': 'string', 'wide': 'int64',
+        'wide_unit': 'string', 'leaf_color': 'string'}, 'required': ['id']},
+    'plant_earliest_waterings': {'columns': {
+        'plant_id': 'int64', 'watering_time': 'string', 'id': 'int64'}, 'required': ['id']},
+    'plant_faqs': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'question': 'string', 'answer': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'plant_images': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'file_name': 'string', 'is_primary': 'bool',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'plant_instruction_categories': {'columns': {
+        'id': 'int64', 'name': 'string', 'description': 'string', 'image_url': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'plant_instructions': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'step_number': 'int64', 'step_title': 'string', 'step_description': 'string',
+        'step_image_url': 'string', 'additional_tips': 'string', 'created_at': 'datetime', 'updated_at': 'datetime',
+        'instruction_category_id': 'int64'}, 'required': ['id']},
+    'plant_progresses': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'user_id': 'int64', 'image_url': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'plant_reminders': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'watering_frequency': 'int64', 'each': 'string', 'watering_amount': 'int64',
+        'unit': 'string', 'watering_time': 'string', 'weather_condition': 'string', 'condition_description': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'plants': {'columns': {
+        'id': 'int64', 'name': 'string', 'description': 'string', 'is_toxic': 'bool', 'harvest_duration': 'int64',
+        'sunlight': 'string', 'planting_time': 'string', 'plant_category_id': 'int64', 'climate_condition': 'string',
+        'plant_characteristic_id': 'int64', 'created_at': 'datetime', 'updated_at': 'datetime',
+        'additional_tips': 'string'}, 'required': ['id']},
+    'user_plant_histories': {'columns': {
+        'id': 'int64', 'user_id': 'int64', 'plant_id': 'int64', 'plant_name': 'string', 'plant_category': 'string',
+        'plant_image_url': 'string', 'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['id']},
+    'user_plants': {'columns': {
+        'id': 'int64', 'user_id': 'int64', 'plant_id': 'int64', 'created_at': 'datetime', 'updated_at': 'datetime',
+        'last_watered_at': 'datetime', 'customize_name': 'string', 'instruction_category1': 'int64',
+        'instruction_category2': 'int64', 'instruction_category3': 'int64', 'instruction_category4': 'int64'},
+        'required': ['id']},
+    'users': {'columns': {
+        'id': 'int64', 'name': 'string', 'email': 'string', 'password': 'string', 'is_active': 'bool', 'otp': 'int64',
+        'url_image': 'string', 'created_at': 'datetime', 'updated_at': 'datetime', 'fcm_token': 'string'},
+        'required': ['id']},
+    'watering_histories': {'columns': {
+        'id': 'int64', 'plant_id': 'int64', 'user_id': 'int64', 'created_at': 'datetime', 'updated_at': 'datetime'},
+        'required': ['id']},
+}
+# Schema tabel hasil transformasi yang dimuat ke BigQuery
+TARGET_SCHEMAS = {
+    'dim_admins': {'columns': {
+        'admin_id': 'int64', 'admin_name': 'string', 'email': 'string', 'password': 'string', 'url_image': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['admin_id']},
+    'dim_users': {'columns': {
+        'user_id': 'int64', 'user_name': 'string', 'email': 'string', 'password': 'string', 'is_active': 'bool',
+        'otp': 'int64', 'url_image': 'string', 'created_at': 'datetime', 'updated_at': 'datetime',
+        'fcm_token': 'string'}, 'required': ['user_id']},
+    'dim_my_plants': {'columns': {
+        'my_plant_id': 'int64', 'user_name': 'string', 'plant_name': 'string', 'plant_key': 'int64',
+        'created_at': 'datetime', 'updated_at': 'datetime', 'last_watered_at': 'datetime'}, 'required': ['my_plant_id']},
+    'dim_planting_histories': {'columns': {
+        'planting_history_id': 'int64', 'user_name': 'string', 'plant_name': 'string', 'plant_key': 'int64',
+        'plant_category': 'string', 'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['planting_history_id']},
+    'dim_watering_histories': {'columns': {
+        'watering_history_id': 'int64', 'user_name': 'string', 'plant_name': 'string', 'plant_key': 'int64',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['watering_history_id']},
+    'dim_customize_watering_reminders': {'columns': {
+        'customize_watering_reminder_id': 'int64', 'my_plant_id': 'int64', 'time': 'string', 'recurring': 'int64',
+        'type': 'string', 'created_at': 'datetime', 'updated_at': 'datetime', 'user_id': 'int64', 'plant_id': 'int64'},
+        'required': ['customize_watering_reminder_id']},
+    # user_id/plant_id di tabel sumber boleh NULL dan tidak lagi diisi 0, sehingga kolomnya NULLABLE
+    'fact_user_activities': {'columns': {
+        'activity_type': 'string', 'user_id': 'int64', 'plant_id': 'int64', 'my_plant_id': 'int64',
+        'planting_history_id': 'int64', 'watering_history_id': 'int64', 'created_at': 'datetime'},
+        'required': ['activity_type']},
+    'agg_user_activities': {'columns': {
+        'user_id': 'int64', 'user_plant_count': 'int64', 'planting_count': 'int64', 'watering_count': 'int64'},
+        'required': ['user_id', 'user_plant_count', 'planting_count', 'watering_count']},
+    'dim_plants': {'columns': {
+        'plant_id': 'int64', 'plant_name': 'string', 'plant_key': 'int64', 'description': 'string', 'is_toxic': 'bool',
+        'harvest_duration': 'int64', 'sunlight': 'string', 'planting_time': 'string', 'plant_category': 'string',
+        'climate_condition': 'string', 'additional_tips': 'string', 'created_at': 'datetime', 'updated_at': 'datetime'},
+        'required': ['plant_id']},
+    'dim_watering_reminders': {'columns': {
+        'watering_reminders_id': 'int64', 'watering_frequency': 'int64', 'each': 'string', 'watering_amount': 'int64',
+        'unit': 'string', 'watering_time': 'string', 'weather_condition': 'string', 'condition_description': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['watering_reminders_id']},
+    'dim_plant_faqs': {'columns': {
+        'plant_faqs_id': 'int64', 'question': 'string', 'answer': 'string', 'created_at': 'datetime',
+        'updated_at': 'datetime'}, 'required': ['plant_faqs_id']},
+    'dim_plant_instructions': {'columns': {
+        'plant_instruction_id': 'int64', 'name_instruction_categories': 'string', 'step_number': 'int64',
+        'step_title': 'string', 'step_description': 'string', 'step_image_url': 'string', 'additional_tips': 'string',
+        'created_at': 'datetime', 'updated_at': 'datetime'}, 'required': ['plant_instruction_id']},
+    'dim_plant_characteristics': {'columns': {
+        'plant_characteristic_id': 'int64', 'height': 'int64', 'height_unit': 'string', 'wide': 'int64',
+        'wide_unit': 'string', 'leaf_color': 'string'}, 'required': ['plant_characteristic_id']},
+    'fact_plants_data': {'columns': {
+        'plant_id': 'int64', 'dimension': 'string', 'plant_faqs_id': 'int64', 'plant_characteristic_id': 'int64',
+        'plant_instruction_id': 'int64', 'watering_reminders_id': 'int64'},
+        'required': ['plant_id', 'dimension']},
+    'agg_plants_data': {'columns': {
+        'plant_id': 'int64', 'watering_reminder_count': 'int64', 'faq_count': 'int64', 'instruction_count': 'int64',
+        'characteristic_count': 'int64'},
+        'required': ['plant_id', 'watering_reminder_count', 'faq_count', 'instruction_count', 'characteristic_count']},
+}
+# Naikkan versi ini saat logika transformasi berubah agar seluruh fingerprint transform dan load tidak berlaku
+PIPELINE_VERSION = '7'
+# Nama tabel sumber, step transform atau tabel load yang tidak boleh dilewati meski tidak berubah, atau 'all'
+FORCE_REFRESH = [name for name in os.getenv('FORCE_REFRESH', '').split(',') if name]
+
 # Default arguments untuk DAG
 default_args = {
     'owner': 'Plantopia',
@@ -31,333 +247,1800 @@ dag = DAG(
 )
 
 def get_connection():
+    from sqlalchemy import create_engine
+    if SOURCE == 'sqlite':
+        return create_engine(f"sqlite:///{SOURCE_PATH}")
+    if SOURCE == 'csv':
+        return create_engine(f"sqlite:///{csv_folder_to_sqlite(SOURCE_PATH, CSV_SOURCE_DB)}")
     user = os.getenv('DB_USER')
     password = os.getenv('DB_PASSWORD')
     host = os.getenv('DB_HOST')
     port = os.getenv('DB_PORT')
     database = os.getenv('DB_NAME')
-    return create_engine(f"mysql+pymysql://{user}:{password}@{host}:{port}/{database}")
+    # Satu koneksi per worker ekstraksi ditambah satu untuk inspector
+    return create_engine(
+        f"mysql+pymysql://{user}:{password}@{host}:{port}/{database}",
+        pool_size=max(EXTRACT_PARALLELISM, 1) + 1,
+        max_overflow=2,
+        pool_timeout=30,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+    )
+
+def csv_folder_to_sqlite(csv_dir, db_path):
+    import sqlite3
+    import pandas as pd
+    # Folder CSV disalin ke SQLite agar extract_task membacanya lewat SQLAlchemy seperti MySQL.
+    # Hanya file yang ukuran atau mtime-nya berubah sejak salinan terakhir yang disalin ulang.
+    create_directory_if_not_exists(os.path.dirname(db_path))
+    files = {name[:-len('.csv')]: os.path.join(csv_dir, name) for name in sorted(os.listdir(csv_dir)) if name.endswith('.csv')}
+    with sqlite3.connect(db_path) as connection:
+        existing = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in existing - set(files):
+            connection.execute(f'DROP TABLE "{table}"')
+        for table, path in files.items():
+            stat = os.stat(path)
+            fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            if table in existing and read_fingerprint('source_csv', table) == fingerprint:
+                continue
+            # Header dibaca dulu sehingga file tanpa baris tetap menjadi tabel kosong
+            pd.read_csv(path, nrows=0).to_sql(table, connection, index=False, if_exists='replace')
+            for chunk in pd.read_csv(path, chunksize=EXTRACT_CHUNK_SIZE):
+                chunk.to_sql(table, connection, index=False, if_exists='append')
+            write_fingerprint('source_csv', table, fingerprint)
+            print(f"Menyalin {path} ke {db_path}")
+    return db_path
 
 def get_all_tables(engine):
+    from sqlalchemy import inspect
     inspector = inspect(engine)
     return inspector.get_table_names()
 
-def table_to_dataframe(engine, table_name):
+def get_table_columns(engine, table_name):
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    return [column['name'] for column in inspector.get_columns(table_name)]
+
+def get_watermark_column(columns):
+    # Merge ke snapshot membutuhkan primary key 'id'
+    if 'id' not in columns:
+        return None
+    for column in WATERMARK_COLUMNS:
+        if column in columns:
+            return column
+    return None
+
+def probe_table_changes(engine, tables):
+    # Satu query untuk semua tabel; nilai None berarti perubahan tidak bisa dipastikan
+    from sqlalchemy import text
+    if not tables:
+        return {}
+    quote = engine.dialect.identifier_preparer.quote
     with engine.connect() as connection:
-        query = f"SELECT * FROM {table_name}"
-        result = connection.execute(query)
-        df = pd.DataFrame(result.fetchall(), columns=result.keys())
+        if CHANGE_PROBE == 'checksum':
+            rows = connection.execute(text(f"CHECKSUM TABLE {', '.join(quote(table) for table in tables)}")).fetchall()
+            # Kolom Table berisi 'database.tabel'
+            return {row[0].split('.', 1)[-1]: None if row[1] is None else str(row[1]) for row in rows}
+        if CHANGE_PROBE == 'information_schema':
+            rows = connection.execute(text(
+                "SELECT TABLE_NAME, TABLE_ROWS, UPDATE_TIME FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE()")).fetchall()
+            # UPDATE_TIME InnoDB kosong setelah server restart, tabel tersebut tetap diekstrak
+            return {row[0]: None if row[2] is None else f"{row[1]}|{row[2]}" for row in rows if row[0] in tables}
+        if CHANGE_PROBE == 'stats':
+            selects = []
+            for table in tables:
+                columns = SOURCE_SCHEMAS.get(table, {}).get('columns', {})
+                latest = ', '.join(f"MAX({quote(column)})" if column in columns else 'NULL' for column in WATERMARK_COLUMNS)
+                selects.append(f"SELECT '{table}', COUNT(*), {latest} FROM {quote(table)}")
+            rows = connection.execute(text(' UNION ALL '.join(selects))).fetchall()
+            return {row[0]: '|'.join(str(value) for value in row[1:]) for row in rows}
+    raise ValueError(f"CHANGE_PROBE tidak dikenal: {CHANGE_PROBE}")
+
+def probe_config(table):
+    # Perubahan schema registry atau format staging juga membuat tabel diekstrak ulang
+    return hash_values(PIPELINE_VERSION, STAGING_FORMAT, CHANGE_PROBE, extract_schema_for(table))
+
+def table_changed(table, probes, output_dir):
+    if CHANGE_PROBE == 'off' or force_refresh(table) or probes.get(table) is None:
+        return True
+    if not os.path.exists(staged_path(output_dir, table)):
+        return True
+    previous = read_fingerprint('probe', table)
+    return previous is None or previous != {'value': probes[table], 'config': probe_config(table)}
+
+def table_to_dataframe_chunks(engine, table_name, chunksize=EXTRACT_CHUNK_SIZE, where=None, params=None, columns=None):
+    from sqlalchemy import text
+    import pandas as pd
+    # stream_results memakai server-side cursor, hanya satu chunk yang ditahan di memori
+    quote = engine.dialect.identifier_preparer.quote
+    selected = '*' if columns is None else ', '.join(quote(column) for column in columns)
+    query = f"SELECT {selected} FROM {table_name}"
+    if where:
+        query = f"{query} WHERE {where}"
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(text(query), params or {})
+        columns = list(result.keys())
+        empty = True
+        while True:
+            rows = result.fetchmany(chunksize)
+            if not rows:
+                break
+            empty = False
+            yield pd.DataFrame(rows, columns=columns)
+        # Tabel kosong tetap menghasilkan satu frame agar header CSV tertulis
+        if empty:
+            yield pd.DataFrame(columns=columns)
+
+def source_schema_for(name):
+    # File dim_{table} hasil ekstraksi memakai schema tabel sumbernya
+    if name.startswith('dim_') and name[len('dim_'):] in SOURCE_SCHEMAS:
+        return SOURCE_SCHEMAS[name[len('dim_'):]]
+    return SOURCE_SCHEMAS.get(name)
+
+def pushdown_columns():
+    # Kolom tiap tabel sumber yang dibaca query PUSHDOWN_STEPS, dalam urutan SOURCE_SCHEMAS
+    needed = {}
+    for step in PUSHDOWN_STEPS:
+        for name, columns in step['inputs'].items():
+            needed.setdefault(name[len('dim_'):], set()).update(columns)
+    return {table: [column for column in SOURCE_SCHEMAS[table]['columns'] if column in columns]
+            for table, columns in needed.items()}
+
+def extract_schema_for(table):
+    # Dengan SQL_PUSHDOWN hanya kolom yang dipakai query yang diambil dari sumber
+    schema = SOURCE_SCHEMAS.get(table)
+    if SQL_PUSHDOWN != 'duckdb' or schema is None:
+        return schema
+    columns = pushdown_columns().get(table, [])
+    return {'columns': {column: schema['columns'][column] for column in columns},
+            'required': [column for column in schema['required'] if column in columns]}
+
+def check_schema_drift(table, df, schema):
+    columns = list(df.columns)
+    missing = [column for column in schema['columns'] if column not in columns]
+    extra = [column for column in columns if column not in schema['columns']]
+    if not missing and not extra:
         return df
+    message = f"Schema drift di tabel {table}: kolom hilang {missing}, kolom tidak terdaftar {extra}"
+    if missing or SCHEMA_DRIFT == 'fail':
+        raise ValueError(message)
+    print(f"{message}, kolom tidak terdaftar dibuang")
+    return df[list(schema['columns'])]
+
+def parse_schema_columns(df, schema):
+    import pandas as pd
+    # Nilai mentah dikonversi ke tipe registry sebelum cleansing, termasuk chunk yang kolomnya NULL semua.
+    # Integer dan boolean langsung menjadi dtype nullable sehingga cleansing tidak mengisinya dengan 0.
+    for column, column_type in schema['columns'].items():
+        if column_type == 'datetime' and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        elif column_type in ('int64', 'float64', 'bool'):
+            if not pd.api.types.is_numeric_dtype(df[column]):
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+            if column_type != 'float64' and df[column].dtype != SCHEMA_TYPES[column_type]['pandas']:
+                df[column] = df[column].astype(SCHEMA_TYPES[column_type]['pandas'])
+    for column in schema.get('required', []):
+        if df[column].isnull().any():
+            print(f"Kolom wajib '{column}' berisi NULL")
+    return df
+
+def apply_schema(df, schema):
+    import pandas as pd
+    # Tipe akhir diambil dari registry, bukan ditebak dari isi data. Integer dengan lebar berapa pun
+    # dan teks sebagai object atau category sudah sesuai, sehingga hasil compact_dtypes tidak diubah lagi.
+    for column, column_type in schema['columns'].items():
+        if column not in df.columns:
+            continue
+        dtype = SCHEMA_TYPES[column_type]['pandas']
+        if column_type == 'int64' and pd.api.types.is_integer_dtype(df[column]):
+            continue
+        if column_type == 'string' and (df[column].dtype == 'object' or df[column].dtype.name == 'category'):
+            continue
+        if df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def smallest_int_dtype(series):
+    import numpy as np
+    # Lebar integer terkecil yang memuat nilai minimum dan maksimum; Int* (nullable) jika ada NULL
+    nullable = series.isna().any()
+    low, high = (int(series.min()), int(series.max())) if series.notna().any() else (0, 0)
+    for bits in (8, 16, 32, 64):
+        info = np.iinfo(f"int{bits}")
+        if info.min <= low and high <= info.max:
+            return f"Int{bits}" if nullable else f"int{bits}"
+
+def compact_dtypes(df):
+    import pandas as pd
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_integer_dtype(series):
+            dtype = smallest_int_dtype(series)
+            if series.dtype != dtype:
+                df[column] = series.astype(dtype)
+        elif series.dtype == 'object' or series.dtype.name == 'category':
+            # Category hanya menghemat memori jika nilai yang sama sering berulang
+            low_cardinality = series.nunique() <= CATEGORY_MAX_RATIO * len(series)
+            if low_cardinality and series.dtype == 'object':
+                df[column] = series.astype('category')
+            elif not low_cardinality and series.dtype.name == 'category':
+                df[column] = series.astype('object')
+    return df
+
+def optimize_dtypes(name, df, schema=None):
+    before = int(df.memory_usage(deep=True).sum())
+    if schema is not None:
+        df = apply_schema(df, schema)
+    df = compact_dtypes(df)
+    after = int(df.memory_usage(deep=True).sum())
+    print(f"Optimasi dtype {name}: {before} -> {after} byte (hemat {before - after} byte)")
+    return df
+
+def csv_read_options(schema, columns=None):
+    # dtype dan parse_dates eksplisit untuk pd.read_csv, tanpa inferensi tipe per file
+    if schema is None:
+        return {}
+    dtype = {}
+    parse_dates = []
+    for column, column_type in schema['columns'].items():
+        if columns is not None and column not in columns:
+            continue
+        if column_type == 'datetime':
+            parse_dates.append(column)
+        else:
+            dtype[column] = SCHEMA_TYPES[column_type]['pandas']
+    return {'dtype': dtype, 'parse_dates': parse_dates}
+
+def align_chunk_dtypes(df, dtypes):
+    import pandas as pd
+    # Kolom yang NULL semua di satu chunk terbaca sebagai object, samakan dengan chunk pertama
+    for col, dtype in dtypes.items():
+        if col in df.columns and df[col].dtype == 'object' and dtype != 'object' and df[col].isnull().all():
+            if pd.api.types.is_numeric_dtype(dtype):
+                df[col] = df[col].astype('float64')
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                df[col] = pd.to_datetime(df[col])
+    return df
+
+def drop_duplicate_rows(df, keys=None, seen_hashes=None):
+    import numpy as np
+    import pandas as pd
+    # Setiap baris (atau kolom kunci saja) di-hash satu kali; hash yang sama dipakai untuk duplikat di dalam
+    # frame dan terhadap chunk sebelumnya. seen_hashes adalah set yang diperbarui di tempat, sehingga biaya
+    # per chunk sebanding dengan ukuran chunk, bukan dengan jumlah baris yang sudah dibaca.
+    hashes = pd.util.hash_pandas_object(df if keys is None else df[keys], index=False).to_numpy()
+    duplicated = pd.Series(hashes).duplicated().to_numpy()
+    if seen_hashes is not None:
+        duplicated |= np.fromiter(map(seen_hashes.__contains__, hashes.tolist()), dtype=bool, count=len(hashes))
+    print(f"Jumlah baris duplikat: {int(duplicated.sum())}")
+    if duplicated.any():
+        print("Menghapus baris duplikat...")
+        df = df[~duplicated]
+        hashes = hashes[~duplicated]
+    if seen_hashes is None:
+        return df, hashes
+    seen_hashes.update(hashes.tolist())
+    return df, seen_hashes
+
+def write_csv_chunk(df, path, header):
+    # Format tanggal tetap, pandas memotong jam/milidetik jika seluruh nilai di satu chunk kebetulan bulat
+    df.to_csv(path, mode='w' if header else 'a', header=header, index=False, date_format=DATE_FORMAT)
+
+def staged_path(directory, name, staging_format=STAGING_FORMAT):
+    return os.path.join(directory, f"{name}{STAGING_EXTENSIONS[staging_format]}")
+
+def staging_format_of(path):
+    for staging_format, extension in STAGING_EXTENSIONS.items():
+        if path.endswith(extension):
+            return staging_format
+    raise ValueError(f"Format staging tidak dikenal untuk file {path}")
+
+def arrow_schema_for(table, staging_format):
+    import pyarrow as pa
+    # Indeks dictionary diseragamkan agar chunk dengan jumlah kategori berbeda tetap satu schema.
+    # File Arrow IPC hanya mengizinkan satu dictionary per kolom, sehingga kategori disimpan sebagai nilainya.
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            if staging_format == 'feather':
+                field = field.with_type(field.type.value_type)
+            else:
+                field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        fields.append(field)
+    schema = pa.schema(fields, metadata=table.schema.metadata)
+    return utc_timestamp_schema(schema) if staging_format == 'parquet' else schema
+
+def utc_timestamp_schema(schema):
+    import pyarrow as pa
+    # Parquet yang dimuat ke BigQuery menandai timestamp sebagai UTC (isAdjustedToUTC=true); timestamp naive
+    # dibaca BigQuery sebagai DATETIME, bukan TIMESTAMP. Nilainya sama dengan yang dianggap UTC oleh load DataFrame.
+    return pa.schema([
+        field.with_type(pa.timestamp(field.type.unit, tz='UTC'))
+        if pa.types.is_timestamp(field.type) and field.type.tz is None else field
+        for field in schema
+    ], metadata=schema.metadata)
+
+def naive_timestamps(df):
+    import pandas as pd
+    # Timestamp UTC dari staging Parquet dikembalikan naive (UTC), seperti kolom datetime lain di pipeline
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.tz_convert(None)
+    return df
+
+def write_staged_chunks(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    staging_format = staging_format_of(path)
+    rows = 0
+    if staging_format == 'csv':
+        header = True
+        for df in chunks:
+            write_csv_chunk(df, path, header)
+            header = False
+            rows += len(df)
+        return rows
+
+    writer = None
+    schema = None
+    try:
+        for df in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                schema = arrow_schema_for(table, staging_format)
+                if staging_format == 'parquet':
+                    # BigQuery membaca timestamp Parquet dalam mikrodetik
+                    writer = pq.ParquetWriter(path, schema, coerce_timestamps='us', allow_truncated_timestamps=True)
+                else:
+                    writer = pa.ipc.new_file(path, schema)
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def write_staged(df, path):
+    return write_staged_chunks([df], path)
+
+def read_staged(path, columns=None, schema=None):
+    import pandas as pd
+    staging_format = staging_format_of(path)
+    if staging_format == 'parquet':
+        return naive_timestamps(pd.read_parquet(path, columns=columns))
+    if staging_format == 'feather':
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, **csv_read_options(schema, columns))
+
+def iter_staged(path, columns=None, chunksize=EXTRACT_CHUNK_SIZE):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    staging_format = staging_format_of(path)
+    if staging_format == 'parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield naive_timestamps(batch.to_pandas())
+    elif staging_format == 'feather':
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+def read_staged_columns(path):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    staging_format = staging_format_of(path)
+    if staging_format == 'parquet':
+        return pq.read_schema(path).names
+    if staging_format == 'feather':
+        return pa.ipc.open_file(pa.memory_map(path)).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def to_watermark_value(value):
+    import pandas as pd
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.strftime(DATE_FORMAT)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+def load_watermarks(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_watermarks(path, watermarks):
+    create_directory_if_not_exists(os.path.dirname(path))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(watermarks, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+# Metrik unit kerja (tabel, chunk, step transformasi, load job) milik proses ini, dikumpulkan oleh measure()
+_metrics = []
+_metrics_lock = threading.Lock()
+
+def current_rss():
+    # Resident set size proses dalam byte; /proc hanya tersedia di Linux
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def record_metric(metric):
+    with _metrics_lock:
+        _metrics.append(metric)
+    print(f"METRIC {json.dumps(metric, default=str)}")
+
+@contextlib.contextmanager
+def measure(stage, name, **fields):
+    # Blok yang diukur mengisi rows_in, rows_out dan bytes di dict yang di-yield. CPU dihitung per thread
+    # sehingga tabel yang diekstrak paralel tidak saling terhitung; RSS berlaku untuk seluruh proses.
+    metric = {'stage': stage, 'name': name, 'rows_in': None, 'rows_out': None, 'bytes': None, **fields}
+    rss_start = current_rss()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    metric['status'] = 'error'
+    try:
+        yield metric
+        metric['status'] = 'ok'
+    finally:
+        rss_end = current_rss()
+        metric['wall_seconds'] = round(time.perf_counter() - wall_start, 6)
+        metric['cpu_seconds'] = round(time.thread_time() - cpu_start, 6)
+        metric['rss_bytes'] = rss_end
+        metric['rss_delta_bytes'] = None if rss_start is None or rss_end is None else rss_end - rss_start
+        record_metric(metric)
+
+def report_metrics(task_name):
+    # Ringkasan akhir run per tahap dan unit kerja paling lambat; detail setiap metrik ditulis sebagai JSON Lines
+    with _metrics_lock:
+        metrics = list(_metrics)
+        _metrics.clear()
+    if not metrics:
+        return []
+    create_directory_if_not_exists(METRICS_DIR)
+    path = os.path.join(METRICS_DIR, f"{task_name}.jsonl")
+    with open(path, 'w') as f:
+        for metric in metrics:
+            f.write(json.dumps(metric, default=str) + '\n')
+
+    stages = {}
+    for metric in metrics:
+        total = stages.setdefault(metric['stage'], {'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                    'rows_in': 0, 'rows_out': 0, 'bytes': 0})
+        total['count'] += 1
+        for key in ('wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out', 'bytes'):
+            total[key] += metric.get(key) or 0
+    print(f"Ringkasan metrik {task_name} (detail di {path}):")
+    for stage, total in stages.items():
+        print(f"  {stage}: {total['count']} unit, wall {total['wall_seconds']:.3f} detik, cpu {total['cpu_seconds']:.3f} detik, "
+              f"{total['rows_in']} -> {total['rows_out']} baris, {total['bytes']} byte")
+    print("  Unit paling lambat:")
+    for metric in sorted(metrics, key=lambda metric: metric['wall_seconds'], reverse=True)[:5]:
+        rss_delta = metric.get('rss_delta_bytes')
+        print(f"    {metric['stage']} {metric['name']}: {metric['wall_seconds']:.3f} detik"
+              + (f", RSS {rss_delta:+d} byte" if rss_delta is not None else ""))
+    print(f"METRICS_SUMMARY {json.dumps({'task': task_name, 'stages': stages})}")
+    return metrics
+
+def hash_file(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_values(*values):
+    return hashlib.blake2b(json.dumps(values, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+def fingerprint_path(stage, name):
+    return os.path.join(FINGERPRINT_DIR, stage, f"{name}.json")
+
+def read_fingerprint(stage, name):
+    path = fingerprint_path(stage, name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def write_fingerprint(stage, name, fingerprint):
+    # Satu file per tabel/step sehingga task load paralel tidak saling menimpa
+    save_watermarks(fingerprint_path(stage, name), fingerprint)
+
+def record_file_fingerprint(stage, name, path):
+    stat = os.stat(path)
+    fingerprint = {'hash': hash_file(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    write_fingerprint(stage, name, fingerprint)
+    return fingerprint
+
+def file_fingerprint(stage, name, path):
+    # Hash yang tercatat dipakai ulang selama ukuran dan mtime file sama, selain itu file di-hash ulang
+    fingerprint = read_fingerprint(stage, name)
+    stat = os.stat(path)
+    if fingerprint is not None and fingerprint['size'] == stat.st_size and fingerprint['mtime_ns'] == stat.st_mtime_ns:
+        return fingerprint['hash']
+    return record_file_fingerprint(stage, name, path)['hash']
+
+def force_refresh(name):
+    return 'all' in FORCE_REFRESH or name in FORCE_REFRESH
+
+def merge_into_snapshot(delta_path, snapshot_path, tmp_path, new_keys, key='id'):
+    # Baris lama yang id-nya muncul di data baru diganti, kedua file disalin per chunk
+    def merged_chunks():
+        for chunk in iter_staged(snapshot_path):
+            yield chunk[~chunk[key].isin(new_keys)]
+        yield from iter_staged(delta_path)
+
+    rows = write_staged_chunks(merged_chunks(), tmp_path)
+    os.replace(tmp_path, snapshot_path)
+    os.remove(delta_path)
+    return rows
+
+HTML_TAG_PATTERN = re.compile('<.*?>')
 
 def remove_html_tags(text):
-    clean = re.compile('<.*?>')
-    text = re.sub(clean, '', text)
+    text = HTML_TAG_PATTERN.sub('', text)
     text = html.unescape(text)
     return text
 
-def cleanse_dataframe(df):
+def has_html(value):
+    return isinstance(value, str) and ('<' in value or '&' in value)
+
+def clean_html_uniques(uniques):
+    import numpy as np
+    # Hanya nilai unik yang mengandung '<' atau '&' yang dibersihkan
+    needs_cleaning = np.fromiter((has_html(value) for value in uniques), dtype=bool, count=len(uniques))
+    if not needs_cleaning.any():
+        return None
+    cleaned = np.asarray(uniques, dtype=object).copy()
+    cleaned[needs_cleaning] = [remove_html_tags(value) for value in cleaned[needs_cleaning]]
+    return cleaned
+
+def clean_html_column(series):
+    import numpy as np
+    import pandas as pd
+    if series.dtype.name == 'category':
+        # Bersihkan kategori sekali, lalu petakan ulang kode; kategori yang menjadi sama digabung
+        cleaned = clean_html_uniques(series.cat.categories)
+        if cleaned is None:
+            return series
+        category_codes, categories = pd.factorize(cleaned)
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes == -1, -1, category_codes[codes])
+        return pd.Series(pd.Categorical.from_codes(codes, categories), index=series.index, name=series.name)
+
+    # Kolom object difaktorkan sekali sehingga teks yang berulang hanya dibersihkan satu kali
+    codes, uniques = pd.factorize(series)
+    cleaned = clean_html_uniques(uniques)
+    if cleaned is None:
+        return series
+    values = series.to_numpy(dtype=object, copy=True)
+    present = codes != -1
+    values[present] = cleaned[codes[present]]
+    return pd.Series(values, index=series.index, name=series.name)
+
+def fill_missing_values(df):
     print("Memeriksa missing values...")
-    
-    # Mengisi missing values berdasarkan tipe data kolom
-    for col in df.columns:
-        if df[col].isnull().any():
-            if df[col].dtype == 'int64' or df[col].dtype == 'float64':
-                print(f"Mengisi missing values di kolom '{col}' dengan 0...")
-                df[col].fillna(0, inplace=True)
-            elif df[col].dtype == 'object' or df[col].dtype.name == 'category':
-                print(f"Mengisi missing values di kolom '{col}' dengan '-'...")
-                df[col].fillna('-', inplace=True)
-            elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                print(f"Mengisi missing values di kolom '{col}' dengan tanggal hari ini...")
-                df[col].fillna(pd.Timestamp('today'), inplace=True)
-    
+    # Mask NULL dihitung sekali untuk seluruh frame, lalu semua kolom diisi dengan satu fillna.
+    # Datetime NULL dibiarkan NULL: tanggal hari ini membuat isi snapshot berubah di setiap run.
+    null_counts = df.isna().sum()
+    fill_values = {}
+    for col in null_counts[null_counts > 0].index:
+        if df[col].dtype == 'int64' or df[col].dtype == 'float64':
+            print(f"Mengisi missing values di kolom '{col}' dengan 0...")
+            fill_values[col] = 0
+        elif df[col].dtype == 'object' or df[col].dtype.name == 'category':
+            print(f"Mengisi missing values di kolom '{col}' dengan '-'...")
+            # Kolom category dari staging Parquet/Arrow harus punya kategori '-' sebelum diisi
+            if df[col].dtype.name == 'category' and '-' not in df[col].cat.categories:
+                df[col] = df[col].cat.add_categories('-')
+            fill_values[col] = '-'
+    return df.fillna(fill_values) if fill_values else df
+
+def clean_html_columns(df):
     for col in df.columns:
         if df[col].dtype == 'object' or df[col].dtype.name == 'category':
-            print(f"Membersihkan tag HTML di kolom '{col}'...")
-            df[col] = df[col].apply(lambda x: remove_html_tags(x) if pd.notnull(x) else x)
-    
-    print("Memeriksa duplikasi...")
-    duplicate_rows = df.duplicated().sum()
-    print(f"Jumlah baris duplikat: {duplicate_rows}")
-    
-    if duplicate_rows > 0:
-        print("Menghapus baris duplikat...")
-        df.drop_duplicates(inplace=True)
-
+            original = df[col]
+            cleaned = clean_html_column(original)
+            if cleaned is not original:
+                print(f"Membersihkan tag HTML di kolom '{col}'...")
+                df[col] = cleaned
     return df
 
-def cleanse_dataframe_fact(df):
-    print("Memeriksa missing values...")
-    for col in df.columns:
-        if df[col].isnull().any():
-            if df[col].dtype == 'int64' or df[col].dtype == 'float64':
-                print(f"Mengisi missing values di kolom '{col}' dengan -1...")
-                df[col].fillna(-1, inplace=True)
+def cleanse_dataframe(df, dedup_keys=None):
+    df = clean_html_columns(fill_missing_values(df))
+    print("Memeriksa duplikasi...")
+    df, _ = drop_duplicate_rows(df, dedup_keys)
     return df
 
+def mark_cleansed(table, path):
+    # Menandai file staging yang sudah dibersihkan beserta hash isinya dan versi pipeline
+    write_fingerprint('cleanse', table, {'hash': file_fingerprint('extract', table, path), 'stage': 'extract',
+                                         'version': PIPELINE_VERSION})
+
+def cleansed_by(table, path):
+    # Tahap yang sudah membersihkan file ini, atau None jika isinya berubah sejak ditandai
+    marker = read_fingerprint('cleanse', table)
+    if marker is None or marker['version'] != PIPELINE_VERSION or not os.path.exists(path):
+        return None
+    return marker['stage'] if marker['hash'] == file_fingerprint('extract', table, path) else None
+
 def change_type_data(df):
+    import pandas as pd
     # Memastikan tipe data yang benar
     print(f"Memastikan tipe data yang benar...")
+    # Hanya untuk tabel di luar registry. Float menjadi Int64 (nullable) jika semua nilainya bilangan bulat,
+    # sehingga NaN tidak merusak cast dan pecahan tidak terpotong.
     for column in df.columns:
         if df[column].dtype == 'object':
             df[column] = df[column].astype('category')
-        elif df[column].dtype == 'float64':
-            df[column] = df[column].astype('int64')
-    
+        elif df[column].dtype == 'float64' and (df[column].dropna() % 1 == 0).all():
+            df[column] = df[column].astype('Int64')
+
     # Pastikan kolom tanggal diubah menjadi datetime dengan format '%Y-%m-%d %H:%M'
     date_columns = ['created_at', 'updated_at', 'last_watered_at']
     for column in date_columns:
         if column in df.columns:
             print(f"Mengonversi kolom '{column}' menjadi datetime dengan format '%Y-%m-%d %H:%M:%S'...")
             df[column] = pd.to_datetime(df[column], errors='coerce', format='%Y-%m-%d %H:%M:%S')
-    
-    # Isi nilai NULL di kolom created_at jika ada
-    if 'created_at' in df.columns:
-        df['created_at'].fillna(datetime.now(), inplace=True)  # Isi dengan tanggal dan waktu saat ini
-    if 'updated_at' in df.columns:
-        df['updated_at'].fillna(datetime.now(), inplace=True)  # Isi dengan tanggal dan waktu saat ini
+    # Tanggal NULL tetap NaT seperti di tabel registry; waktu saat ini membuat isi snapshot berubah di setiap run
 
     return df
 
+def extract_table(engine, table, output_dir, watermark=None, metric=None):
+    metric = metric if metric is not None else {}
+    metric['rows_in'] = 0
+    snapshot_path = staged_path(output_dir, table)
+    schema = extract_schema_for(table)
+    # Proyeksi SQL_PUSHDOWN dijalankan di sumber, kolom lain tidak ikut dikirim
+    selected = None if SQL_PUSHDOWN != 'duckdb' or schema is None else list(schema['columns'])
+    if schema is None:
+        message = f"Tabel {table} tidak terdaftar di SOURCE_SCHEMAS"
+        if SCHEMA_DRIFT == 'fail':
+            raise ValueError(message)
+        print(f"{message}, tipe data ditebak dari isi data")
+
+    column = None
+    if EXTRACT_MODE == 'incremental' and table in INCREMENTAL_TABLES:
+        columns = get_table_columns(engine, table)
+        expected_columns = columns if schema is None else [c for c in columns if c in schema['columns']]
+        column = get_watermark_column(expected_columns)
+        # Snapshot dengan kolom berbeda (schema berubah) harus diekstrak ulang penuh
+        if column is not None and os.path.exists(snapshot_path):
+            if read_staged_columns(snapshot_path) != expected_columns:
+                watermark = None
+
+    incremental = (column is not None and watermark is not None
+                   and watermark.get('column') == column and os.path.exists(snapshot_path))
+    if incremental:
+        operator = '>=' if column == 'updated_at' else '>'
+        chunks = table_to_dataframe_chunks(engine, table, where=f"{column} {operator} :watermark",
+                                           params={'watermark': watermark['value']}, columns=selected)
+    else:
+        chunks = table_to_dataframe_chunks(engine, table, columns=selected)
+
+    part_path = staged_path(output_dir, f"{table}.part")
+    state = {'max_value': None}
+    new_keys = set()
+
+    def cleansed_chunks():
+        # Tabel di DEDUP_KEYS unik menurut primary key di sumber, jadi hanya diperiksa di dalam chunk.
+        # Tabel lain dibandingkan dengan hash semua chunk sebelumnya.
+        seen_hashes = None if table in DEDUP_KEYS else set()
+        dtypes = None
+        for chunk_number, df in enumerate(chunks):
+            if schema is not None:
+                df = parse_schema_columns(check_schema_drift(table, df, schema), schema)
+            elif dtypes is None:
+                dtypes = df.dtypes.to_dict()
+            else:
+                df = align_chunk_dtypes(df, dtypes)
+            # Watermark diambil dari data mentah, sebelum nilai NULL diisi oleh cleansing
+            if column is not None and df[column].notnull().any():
+                chunk_max = df[column].max()
+                state['max_value'] = chunk_max if state['max_value'] is None else max(state['max_value'], chunk_max)
+            if incremental:
+                new_keys.update(df['id'])
+
+            metric['rows_in'] += len(df)
+            with measure('cleanse', table, chunk=chunk_number) as cleanse_metric:
+                cleanse_metric['rows_in'] = len(df)
+                df = clean_html_columns(fill_missing_values(df))
+                df, _ = drop_duplicate_rows(df, DEDUP_KEYS.get(table), seen_hashes)
+                cleanse_metric['rows_out'] = len(df)
+            yield change_type_data(df) if schema is None else apply_schema(df, schema)
+
+    rows = write_staged_chunks(cleansed_chunks(), part_path)
+    max_value = state['max_value']
+    metric['rows_out'] = rows
+
+    new_watermark = watermark if incremental else None
+    if max_value is not None:
+        new_watermark = {'column': column, 'value': to_watermark_value(max_value)}
+
+    if incremental:
+        if rows == 0:
+            os.remove(part_path)
+            print(f"Tidak ada perubahan di tabel {table}, snapshot {snapshot_path} tetap digunakan")
+            return new_watermark
+        print(f"Mengambil {rows} baris baru/berubah dari tabel {table} sejak {column} = {watermark['value']}")
+        with measure('merge', table) as merge_metric:
+            merge_metric['rows_in'] = rows
+            merge_metric['rows_out'] = merge_into_snapshot(part_path, snapshot_path, staged_path(output_dir, f"{table}.tmp"),
+                                                           new_keys)
+            merge_metric['bytes'] = os.path.getsize(snapshot_path)
+        print(f"Merged {rows} rows from table {table} into {snapshot_path}")
+    else:
+        # Isi yang sama dengan snapshot sebelumnya tidak ditulis ulang, sehingga fingerprint dan mtime tetap
+        previous = read_fingerprint('extract', table)
+        if previous is not None and os.path.exists(snapshot_path) and previous['hash'] == hash_file(part_path):
+            os.remove(part_path)
+            print(f"Isi tabel {table} tidak berubah, snapshot {snapshot_path} tetap digunakan")
+            # Isi snapshot sama dengan hasil cleansing run ini, jadi marker dari PIPELINE_VERSION lama diperbarui
+            if cleansed_by(table, snapshot_path) is None:
+                mark_cleansed(table, snapshot_path)
+            metric['bytes'] = os.path.getsize(snapshot_path)
+            return new_watermark
+        os.replace(part_path, snapshot_path)
+        print(f"Saved {rows} rows from table {table} to {snapshot_path}")
+    record_file_fingerprint('extract', table, snapshot_path)
+    mark_cleansed(table, snapshot_path)
+    metric['bytes'] = os.path.getsize(snapshot_path)
+    return new_watermark
+
+def timed_extract_table(engine, table, output_dir, watermark=None):
+    with measure('extract', table) as metric:
+        watermark = extract_table(engine, table, output_dir, watermark, metric)
+    return watermark, metric['wall_seconds']
+
+def extract_tables(engine, tables, output_dir, watermarks):
+    start = time.perf_counter()
+    results = {}
+    # Setiap worker memakai koneksinya sendiri dari pool engine
+    with ThreadPoolExecutor(max_workers=max(EXTRACT_PARALLELISM, 1)) as executor:
+        futures = {
+            executor.submit(timed_extract_table, engine, table, output_dir, watermarks.get(table)): table
+            for table in tables
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    print(f"Durasi ekstraksi per tabel (parallelism={EXTRACT_PARALLELISM}):")
+    for table, (watermark, elapsed) in sorted(results.items(), key=lambda item: item[1][1], reverse=True):
+        print(f"  {table}: {elapsed:.3f} detik")
+    print(f"Total waktu ekstraksi {len(tables)} tabel: {time.perf_counter() - start:.3f} detik")
+    return results
+
 def extract_task():
     engine = get_connection()
     tables = get_all_tables(engine)
-    output_dir = "/home/newrey/airflow/Capstone-Project-Plantopia/data_source_csv"
+    output_dir = OUTPUT_DIR
+    if SQL_PUSHDOWN == 'duckdb':
+        needed = pushdown_columns()
+        unused = [table for table in tables if table not in needed]
+        tables = [table for table in tables if table in needed]
+        if unused:
+            print(f"Tabel tidak dipakai query SQL_PUSHDOWN, ekstraksi dilewati: {', '.join(unused)}")
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    for table in tables:
-        df = table_to_dataframe(engine, table)
-        df = cleanse_dataframe(df)
-        df = change_type_data(df)
-        csv_filename = os.path.join(output_dir, f"{table}.csv")
-        df.to_csv(csv_filename, index=False)
-        print(f"Saved DataFrame from table {table} to {csv_filename}")
+    # Probe diambil sebelum data dibaca; perubahan selama ekstraksi akan terdeteksi di run berikutnya
+    probes = probe_table_changes(engine, tables) if CHANGE_PROBE != 'off' else {}
+    changed_tables = [table for table in tables if table_changed(table, probes, output_dir)]
+    if len(changed_tables) < len(tables):
+        unchanged = [table for table in tables if table not in changed_tables]
+        print(f"Tabel tidak berubah menurut probe {CHANGE_PROBE}, ekstraksi dilewati: {', '.join(unchanged)}")
+
+    watermarks = load_watermarks(WATERMARK_FILE) if EXTRACT_MODE == 'incremental' else {}
+    results = extract_tables(engine, changed_tables, output_dir, watermarks)
+    for table, (watermark, elapsed) in results.items():
+        if watermark is not None:
+            watermarks[table] = watermark
+        if probes.get(table) is not None:
+            write_fingerprint('probe', table, {'value': probes[table], 'config': probe_config(table)})
+
+    # Watermark hanya disimpan setelah semua snapshot berhasil ditulis
+    if EXTRACT_MODE == 'incremental':
+        save_watermarks(WATERMARK_FILE, watermarks)
 
     # Dimensional tables creation
-    output_dim_dir = "/home/newrey/airflow/Capstone-Project-Plantopia/data_source_dimensional"
+    output_dim_dir = DIM_DIR
     if not os.path.exists(output_dim_dir):
         os.makedirs(output_dim_dir)
-    
+
+    # dim_{table} menunjuk ke file hasil ekstraksi yang sama, tanpa membaca dan menulis ulang isinya
     for table in tables:
-        df_variable_name = f"df_{table}"
-        csv_filename = os.path.join(output_dim_dir, f"dim_{table}.csv")
-        globals()[df_variable_name] = pd.read_csv(os.path.join(output_dir, f"{table}.csv"))
-        globals()[df_variable_name].to_csv(csv_filename, index=False)
-        print(f"Saved DataFrame Dimensional from table {table} to {csv_filename}")
-        
+        dim_filename = staged_path(output_dim_dir, f"dim_{table}")
+        link_staged_file(staged_path(output_dir, table), dim_filename)
+        print(f"Linked DataFrame Dimensional from table {table} to {dim_filename}")
+
+    report_metrics('extract_task')
+
+def link_staged_file(source_path, link_path):
+    # Hardlink jika memungkinkan, symlink jika beda filesystem, salinan sebagai pilihan terakhir.
+    # Link dibuat dengan nama sementara lalu di-rename agar pembaca tidak melihat file setengah jadi.
+    tmp_path = f"{link_path}.link"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(source_path), tmp_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, link_path)
+
 def create_directory_if_not_exists(directory):
     if not os.path.exists(directory):
-        os.makedirs(directory)
+        # exist_ok: beberapa thread load bisa membuat direktori yang sama bersamaan
+        os.makedirs(directory, exist_ok=True)
 
-def transform_task():
-    # Define directory paths
-    output_dir = "/home/newrey/airflow/Capstone-Project-Plantopia/data_source_csv"
-    dim_dir = "/home/newrey/airflow/Capstone-Project-Plantopia/data_source_dimensional"
-    final_dir = "/home/newrey/airflow/Capstone-Project-Plantopia/data_source_to_load"
+class DataFrameCatalog:
+    # Registry frame untuk transform_task: file staging dimuat saat pertama diminta, hanya kolom
+    # yang dipakai step yang dibaca, dan frame dilepas setelah konsumen terakhirnya selesai.
+    def __init__(self, directory, steps):
+        self.directory = directory
+        self.frames = {}
+        self.connection = None
+        self.consumers = {}
+        self.columns = {}
+        for step in steps:
+            for name, columns in step['inputs'].items():
+                self.consumers[name] = self.consumers.get(name, 0) + 1
+                if name in self.columns and (self.columns[name] is None or columns is None):
+                    self.columns[name] = None
+                elif name in self.columns:
+                    self.columns[name] = self.columns[name] + [c for c in columns if c not in self.columns[name]]
+                else:
+                    self.columns[name] = None if columns is None else list(columns)
 
-    # Create directories if they do not exist
-    create_directory_if_not_exists(output_dir)
-    create_directory_if_not_exists(dim_dir)
-    create_directory_if_not_exists(final_dir)
+    def get(self, name):
+        if name not in self.frames:
+            df = read_staged(staged_path(self.directory, name), columns=self.columns.get(name),
+                             schema=source_schema_for(name))
+            print(f"Memuat {name} ({len(df)} baris, {len(df.columns)} kolom)...")
+            # File dari extract_task sudah dibersihkan per chunk, jadi tidak dibersihkan ulang
+            stage = cleansed_by(name[len('dim_'):], staged_path(self.directory, name))
+            if stage is None:
+                with measure('cleanse', name) as metric:
+                    metric['rows_in'] = len(df)
+                    df = cleanse_dataframe(df, DEDUP_KEYS.get(name[len('dim_'):]))
+                    metric['rows_out'] = len(df)
+            else:
+                print(f"{name} sudah dibersihkan saat {stage}, cleansing dilewati")
+            self.frames[name] = optimize_dtypes(name, df, source_schema_for(name))
+        return self.frames[name]
+
+    def sql(self):
+        import duckdb
+        # Satu koneksi DuckDB in-memory untuk semua step SQL_PUSHDOWN dalam satu run
+        if self.connection is None:
+            self.connection = duckdb.connect()
+        return self.connection
+
+    def register(self, name):
+        import pyarrow.parquet as pq
+        # Input query SQL_PUSHDOWN didaftarkan dengan nama tabel sumbernya. File Parquet yang sudah dibersihkan
+        # dibaca DuckDB langsung (hanya kolom yang dipakai query); file lain dimuat dan dibersihkan lewat get()
+        path = staged_path(self.directory, name)
+        if staging_format_of(path) == 'parquet' and cleansed_by(name[len('dim_'):], path) is not None:
+            self.sql().read_parquet(path).create_view(name[len('dim_'):])
+            return pq.ParquetFile(path).metadata.num_rows
+        df = self.get(name)
+        self.sql().register(name[len('dim_'):], df)
+        return len(df)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def put(self, name, df):
+        # Frame turunan hanya disimpan jika masih ada step yang membutuhkannya
+        if self.consumers.get(name, 0) > 0:
+            self.frames[name] = df
+
+    def consumed(self, name):
+        self.consumers[name] -= 1
+        if self.consumers[name] <= 0:
+            self.release(name)
+
+    def release(self, name):
+        if self.frames.pop(name, None) is not None:
+            print(f"Melepas {name} dari memori")
 
-    # Loading dimensional dataframes
-    dataframe_dimensional = []
-    for filename in os.listdir(dim_dir):
-        if filename.endswith('.csv'):
-            table_name = os.path.splitext(filename)[0]
-            df_variable_name = f"df_{table_name}"
-            df_path = os.path.join(dim_dir, filename)
-            globals()[df_variable_name] = pd.read_csv(df_path)
-            dataframe_dimensional.append(df_variable_name)
-
-    # Cleansing dimensional dataframes
-    for dataframe in dataframe_dimensional:
-        df_variable_name = f"{dataframe}"
-        globals()[df_variable_name] = cleanse_dataframe(globals()[df_variable_name])
-
-    # Rename columns for merging
-    df_dim_admins = globals()['df_dim_admins']
-    df_dim_admins.rename(columns={'id': 'admin_id', 'name': 'admin_name'}, inplace=True)
-    df_dim_admins.to_csv(os.path.join(final_dir, 'dim_admins.csv'), index=False)
-    
-    df_dim_users = globals()['df_dim_users']
-    df_dim_users.rename(columns={'id': 'user_id', 'name': 'user_name'}, inplace=True)
-    df_dim_users.to_csv(os.path.join(final_dir, 'dim_users.csv'), index=False)
-
-    df_dim_plants = globals()['df_dim_plants']
-    df_dim_plants.rename(columns={'id': 'plant_id', 'name': 'plant_name'}, inplace=True)
-    df_dim_plants['plant_name'] = df_dim_plants['plant_name'].str.split(' -').str[0].str.title()
-    df_dim_plants['plant_name'] = df_dim_plants['plant_name'].str.split('-').str[0].str.title()
-
-    # Merge tables to create fact table user activities
-    df_dim_user_plants = globals()['df_dim_user_plants']
-    df_dim_my_plants = df_dim_user_plants.merge(df_dim_users, on='user_id', how='left', suffixes=('', '_user'))
-    df_dim_my_plants = df_dim_my_plants.merge(df_dim_plants, on='plant_id', how='left', suffixes=('', '_plant'))
-    df_dim_my_plants = df_dim_my_plants[['id', 'user_name', 'plant_name', 'created_at', 'updated_at', 'last_watered_at']]
-    df_dim_my_plants.rename(columns={'id': 'my_plant_id'}, inplace=True)
-    df_dim_my_plants.to_csv(os.path.join(final_dir, 'dim_my_plants.csv'), index=False)
-
-    # Merging and creating final fact table
-    df_dim_user_plant_histories = globals()['df_dim_user_plant_histories']
-    df_dim_user_plant_histories = df_dim_user_plant_histories.merge(df_dim_users, on='user_id', how='left', suffixes=('', '_user'))
+@functools.lru_cache(maxsize=None)
+def canonical_plant_name(raw_name):
+    # Nama sebelum ' -' atau '-' (misalnya varietas) dibuang, lalu dijadikan title case
+    name = raw_name.split(' -')[0].title()
+    return name.split('-')[0].title()
+
+def plant_key(canonical_name):
+    # Kunci tanaman yang stabil antar run, tidak bergantung pada huruf besar/kecil nama
+    digest = hashlib.blake2b(canonical_name.casefold().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def normalize_plant_names(df, column='plant_name'):
+    import numpy as np
+    import pandas as pd
+    # Nama kanonik dan kuncinya dihitung sekali per nama mentah yang berbeda, lalu setiap baris
+    # dipetakan lewat kode faktorisasi; nama mentah yang berbeda tetapi kanoniknya sama digabung
+    codes, raw_names = pd.factorize(df[column])
+    # Nama NULL sudah menjadi '-' oleh fill_missing_values dan kanoniknya kosong; nama seperti itu dijadikan
+    # NULL dengan plant_key NULL, sama seperti tanaman yang tidak ditemukan di lookup plants
+    canonical = [canonical_plant_name(name) for name in raw_names]
+    canonical_codes, canonical_names = pd.factorize(
+        np.asarray([name if name.strip() else None for name in canonical], dtype=object))
+    keys = pd.array([plant_key(name) for name in canonical_names] + [None], dtype='Int64')
+    codes = np.where(codes == -1, -1, canonical_codes[codes] if len(canonical_codes) else codes)
+    df[column] = pd.Categorical.from_codes(codes, canonical_names)
+    df['plant_key'] = keys[codes]
+    return df
+
+def merge_lookup(left, right, key, suffix):
+    # compact_dtypes memberi kunci join lebar integer yang berbeda di tiap frame. pandas 1.5 gagal
+    # me-merge kunci nullable berisi NULL dengan kunci ber-dtype lain, jadi keduanya disamakan ke Int64
+    if left[key].dtype != right[key].dtype and left[key].isna().any():
+        left = left.assign(**{key: left[key].astype('Int64')})
+        right = right.assign(**{key: right[key].astype('Int64')})
+    return left.merge(right, on=key, how='left', suffixes=('', suffix))
+
+def transform_admins(catalog):
+    df_dim_admins = catalog.get('dim_admins').rename(columns={'id': 'admin_id', 'name': 'admin_name'})
+    return {'dim_admins': df_dim_admins}
+
+def transform_users(catalog):
+    df_dim_users = catalog.get('dim_users').rename(columns={'id': 'user_id', 'name': 'user_name'})
+    catalog.put('users', df_dim_users[['user_id', 'user_name']])
+    return {'dim_users': df_dim_users}
+
+def transform_plants(catalog):
+    df_dim_plants = catalog.get('dim_plants').rename(columns={'id': 'plant_id', 'name': 'plant_name'})
+    df_dim_plants = normalize_plant_names(df_dim_plants)
+    catalog.put('plants', df_dim_plants)
+    return {}
+
+def transform_my_plants(catalog):
+    df_user_plants = catalog.get('dim_user_plants')
+    catalog.put('my_plant_events', df_user_plants[['id', 'user_id', 'plant_id', 'created_at']].rename(columns={'id': 'my_plant_id'}))
+    df_dim_my_plants = merge_lookup(df_user_plants, catalog.get('users'), 'user_id', '_user')
+    df_dim_my_plants = merge_lookup(df_dim_my_plants, catalog.get('plants')[['plant_id', 'plant_name', 'plant_key']], 'plant_id', '_plant')
+    df_dim_my_plants = df_dim_my_plants[['id', 'user_name', 'plant_name', 'plant_key', 'created_at', 'updated_at', 'last_watered_at']]
+    df_dim_my_plants = df_dim_my_plants.rename(columns={'id': 'my_plant_id'})
+    return {'dim_my_plants': df_dim_my_plants}
+
+def transform_planting_histories(catalog):
+    df_user_plant_histories = catalog.get('dim_user_plant_histories')
+    catalog.put('planting_events', df_user_plant_histories[['id', 'user_id', 'plant_id', 'created_at']].rename(
+        columns={'id': 'planting_history_id'}))
+    df_dim_user_plant_histories = merge_lookup(df_user_plant_histories, catalog.get('users'), 'user_id', '_user')
     df_dim_user_plant_histories = df_dim_user_plant_histories[['id', 'user_name', 'plant_name', 'plant_category', 'created_at', 'updated_at']]
-    df_dim_user_plant_histories.rename(columns={'id': 'planting_history_id'}, inplace=True)
-    df_dim_user_plant_histories['plant_name'] = df_dim_user_plant_histories['plant_name'].str.split(' -').str[0].str.title()
-    df_dim_user_plant_histories['plant_name'] = df_dim_user_plant_histories['plant_name'].str.split('-').str[0].str.title()
-    df_dim_user_plant_histories.to_csv(os.path.join(final_dir, 'dim_planting_histories.csv'), index=False)
-
-    df_dim_watering_histories = globals()['df_dim_watering_histories']
-    df_dim_watering_histories = df_dim_watering_histories.merge(df_dim_users, on='user_id', how='left', suffixes=('', '_user')).merge(
-        df_dim_plants, on='plant_id', how='left', suffixes=('', '_plant'))
-    df_dim_watering_histories = df_dim_watering_histories[['id', 'user_name', 'plant_name', 'created_at', 'updated_at']]
-    df_dim_watering_histories.rename(columns={'id': 'watering_history_id'}, inplace=True)
-    df_dim_watering_histories['plant_name'] = df_dim_watering_histories['plant_name'].str.split(' -').str[0].str.title()
-    df_dim_watering_histories['plant_name'] = df_dim_watering_histories['plant_name'].str.split('-').str[0].str.title()
-    df_dim_watering_histories.to_csv(os.path.join(final_dir, 'dim_watering_histories.csv'), index=False)
-
-    df_dim_customize_watering_reminders = globals()['df_dim_customize_watering_reminders']
-    df_dim_customize_watering_reminders.rename(columns={'id': 'customize_watering_reminder_id'}, inplace=True)
-    df_dim_customize_watering_reminders.to_csv(os.path.join(final_dir, 'dim_customize_watering_reminders.csv'), index=False)
-
-    df_fact_user_activities = pd.merge(df_dim_my_plants, df_dim_user_plant_histories,
-                                       on=["user_name", "plant_name"], how='outer',
-                                       suffixes=('_my_plants', '_planting'))
-    df_fact_user_activities = pd.merge(df_fact_user_activities, df_dim_watering_histories,
-                                       on=["user_name", "plant_name"], how='outer',
-                                       suffixes=('_fact', '_watering'))
-    df_fact_user_activities = df_fact_user_activities[['my_plant_id', 'planting_history_id', 'watering_history_id']]
-    df_fact_user_activities['watering_count'] = df_fact_user_activities['watering_history_id'].nunique()
-    df_fact_user_activities['planting_count'] = df_fact_user_activities['planting_history_id'].nunique()
-    df_fact_user_activities['user_plant_count'] = df_fact_user_activities['my_plant_id'].nunique()
-    
-    cleanse_dataframe_fact(df_fact_user_activities)
-    change_type_data(df_fact_user_activities)
-    df_fact_user_activities.to_csv(os.path.join(final_dir, 'fact_user_activities.csv'), index=False)
-
-    # Creating final fact table plants data
-    df_dim_plant_categories = globals()['df_dim_plant_categories']
-    df_dim_plant_categories.rename(columns={'id': 'plant_category_id', 'name': 'plant_category'}, inplace=True)
-    df_dim_plants = df_dim_plants.merge(df_dim_plant_categories, on='plant_category_id', how='left', suffixes=('', '_category'))
-    df_dim_plants = df_dim_plants[['plant_id', 'plant_name', 'description', 'is_toxic', 'harvest_duration',
+    df_dim_user_plant_histories = df_dim_user_plant_histories.rename(columns={'id': 'planting_history_id'})
+    # Riwayat menyimpan salinan nama tanaman saat itu, jadi dinormalisasi sendiri; plant_key-nya sama
+    # dengan dim_plants selama nama kanoniknya sama
+    df_dim_user_plant_histories = normalize_plant_names(df_dim_user_plant_histories)
+    df_dim_user_plant_histories = df_dim_user_plant_histories[['planting_history_id', 'user_name', 'plant_name', 'plant_key',
+                                                               'plant_category', 'created_at', 'updated_at']]
+    return {'dim_planting_histories': df_dim_user_plant_histories}
+
+def transform_watering_histories(catalog):
+    df_watering_histories = catalog.get('dim_watering_histories')
+    catalog.put('watering_events', df_watering_histories[['id', 'user_id', 'plant_id', 'created_at']].rename(
+        columns={'id': 'watering_history_id'}))
+    df_dim_watering_histories = merge_lookup(df_watering_histories, catalog.get('users'), 'user_id', '_user')
+    df_dim_watering_histories = merge_lookup(df_dim_watering_histories, catalog.get('plants')[['plant_id', 'plant_name', 'plant_key']],
+                                             'plant_id', '_plant')
+    # Nama dari frame plants sudah kanonik, tidak perlu dinormalisasi ulang
+    df_dim_watering_histories = df_dim_watering_histories[['id', 'user_name', 'plant_name', 'plant_key', 'created_at', 'updated_at']]
+    df_dim_watering_histories = df_dim_watering_histories.rename(columns={'id': 'watering_history_id'})
+    return {'dim_watering_histories': df_dim_watering_histories}
+
+def transform_customize_watering_reminders(catalog):
+    df_dim_customize_watering_reminders = catalog.get('dim_customize_watering_reminders').rename(
+        columns={'id': 'customize_watering_reminder_id'})
+    return {'dim_customize_watering_reminders': df_dim_customize_watering_reminders}
+
+def build_activity_counts(df_fact, key, type_column, count_columns):
+    # Satu groupby untuk semua jenis baris fakta; hasilnya satu baris per key, bukan nilai
+    # global yang disalin ke setiap baris fakta
+    df_counts = df_fact.groupby([key, type_column], observed=True).size().unstack(fill_value=0)
+    df_counts = df_counts.reindex(columns=list(count_columns), fill_value=0).rename(columns=count_columns)
+    df_counts.columns.name = None
+    return df_counts.reset_index().astype('int64')
+
+def build_fact_user_activities(my_plant_events, planting_events, watering_events):
+    import pandas as pd
+    # Satu baris per aktivitas dengan kunci user_id/plant_id, bukan outer merge pada nama user
+    # dan tanaman yang menghasilkan perkalian baris untuk setiap pasangan user/tanaman
+    events = [
+        my_plant_events.assign(activity_type='my_plant'),
+        planting_events.assign(activity_type='planting'),
+        watering_events.assign(activity_type='watering'),
+    ]
+    df_fact_user_activities = pd.concat(events, ignore_index=True)
+    return df_fact_user_activities[['activity_type', 'user_id', 'plant_id', 'my_plant_id',
+                                    'planting_history_id', 'watering_history_id', 'created_at']]
+
+def transform_fact_user_activities(catalog):
+    df_fact_user_activities = build_fact_user_activities(
+        catalog.get('my_plant_events'), catalog.get('planting_events'), catalog.get('watering_events'))
+    apply_schema(df_fact_user_activities, TARGET_SCHEMAS['fact_user_activities'])
+    df_agg_user_activities = build_activity_counts(
+        df_fact_user_activities, 'user_id', 'activity_type',
+        {'my_plant': 'user_plant_count', 'planting': 'planting_count', 'watering': 'watering_count'})
+    return {'fact_user_activities': df_fact_user_activities, 'agg_user_activities': df_agg_user_activities}
+
+def transform_dim_plants(catalog):
+    df_dim_plant_categories = catalog.get('dim_plant_categories').rename(columns={'id': 'plant_category_id', 'name': 'plant_category'})
+    df_dim_plants = merge_lookup(catalog.get('plants'), df_dim_plant_categories, 'plant_category_id', '_category')
+    df_dim_plants = df_dim_plants[['plant_id', 'plant_name', 'plant_key', 'description', 'is_toxic', 'harvest_duration',
                                    'sunlight', 'planting_time', 'plant_category', 'climate_condition',
                                    'additional_tips', 'created_at', 'updated_at']]
-    df_dim_plants.to_csv(os.path.join(final_dir, 'dim_plants.csv'), index=False)
+    catalog.put('plant_ids', df_dim_plants[['plant_id']])
+    return {'dim_plants': df_dim_plants}
 
-    df_dim_plant_reminders = globals()['df_dim_plant_reminders']
-    df_dim_plant_reminders = df_dim_plant_reminders[['id', 'plant_id', 'watering_frequency', 'each', 'watering_amount',
+def transform_watering_reminders(catalog):
+    df_dim_plant_reminders = catalog.get('dim_plant_reminders').rename(columns={'id': 'watering_reminders_id'})
+    catalog.put('watering_reminders', df_dim_plant_reminders[['watering_reminders_id', 'plant_id']])
+    df_dim_plant_reminders = df_dim_plant_reminders[['watering_reminders_id', 'watering_frequency', 'each', 'watering_amount',
                                                      'unit', 'watering_time', 'weather_condition', 'condition_description',
                                                      'created_at', 'updated_at']]
-    df_dim_plant_reminders.rename(columns={'id': 'watering_reminders_id'}, inplace=True)
-    df_dim_watering_reminders = df_dim_plant_reminders
-
-    df_dim_plant_faqs = globals()['df_dim_plant_faqs']
-    df_dim_plant_faqs.rename(columns={'id': 'plant_faqs_id'}, inplace=True)
-
-    df_dim_plant_instructions = globals()['df_dim_plant_instructions']
-    df_dim_plant_instructions.rename(columns={'id': 'plant_instruction_id'}, inplace=True)
-    df_dim_plant_instruction_categories = globals()['df_dim_plant_instruction_categories']
-    df_dim_plant_instruction_categories.rename(columns={'id': 'instruction_category_id'}, inplace=True)
-    df_dim_plant_instructions = df_dim_plant_instructions.merge(
-        df_dim_plant_instruction_categories, on='instruction_category_id', how='left', suffixes=('', '_category'))
-    df_dim_plant_instructions = df_dim_plant_instructions[['plant_instruction_id', 'name', 'plant_id', 'step_number', 'step_title',
-                                                           'step_description', 'step_image_url', 'additional_tips', 'created_at',
-                                                           'updated_at']]
-    df_dim_plant_instructions.rename(columns={'name': 'name_instruction_categories'}, inplace=True)
-
-    df_dim_plant_characteristics = globals()['df_dim_plant_characteristics']
-    df_dim_plant_characteristics.rename(columns={'id': 'plant_characteristic_id'}, inplace=True)
+    return {'dim_watering_reminders': df_dim_plant_reminders}
 
-    # Merging to final fact table plants data
-    df_fact_plants_data = pd.merge(df_dim_watering_reminders, df_dim_plants, left_on="plant_id", right_on="plant_id", suffixes=('_watering_reminders', '_plant'))
-    df_fact_plants_data = df_fact_plants_data[['plant_id', 'watering_reminders_id']]
-    
-    df_dim_plant_reminders = df_dim_plant_reminders[['watering_reminders_id', 'watering_frequency', 'each', 'watering_amount',
-       'unit', 'watering_time', 'weather_condition', 'condition_description',
-       'created_at', 'updated_at']]
-    df_dim_plant_reminders.to_csv(os.path.join(final_dir, 'dim_watering_reminders.csv'), index=False)
-    
-    df_fact_plants_data = pd.merge(df_dim_plant_faqs, df_fact_plants_data, left_on="plant_id", right_on="plant_id", suffixes=('_faqs', '_fact'))
-    df_fact_plants_data = df_fact_plants_data[['plant_id', 'plant_faqs_id', 'watering_reminders_id']]
-    
+def transform_plant_faqs(catalog):
+    df_dim_plant_faqs = catalog.get('dim_plant_faqs').rename(columns={'id': 'plant_faqs_id'})
+    catalog.put('plant_faqs', df_dim_plant_faqs[['plant_faqs_id', 'plant_id']])
     df_dim_plant_faqs = df_dim_plant_faqs[['plant_faqs_id', 'question', 'answer', 'created_at', 'updated_at']]
-    df_dim_plant_faqs.to_csv(os.path.join(final_dir, 'dim_plant_faqs.csv'), index=False)
-    
-    df_fact_plants_data = pd.merge(df_dim_plant_instructions, df_fact_plants_data, left_on="plant_id", right_on="plant_id", suffixes=('_instructions', '_fact'))
-    df_fact_plants_data = df_fact_plants_data[['plant_id', 'plant_faqs_id', 'plant_instruction_id', 'watering_reminders_id']]
-    
+    return {'dim_plant_faqs': df_dim_plant_faqs}
+
+def transform_plant_instructions(catalog):
+    df_dim_plant_instructions = catalog.get('dim_plant_instructions').rename(columns={'id': 'plant_instruction_id'})
+    df_dim_plant_instruction_categories = catalog.get('dim_plant_instruction_categories').rename(columns={'id': 'instruction_category_id'})
+    df_dim_plant_instructions = merge_lookup(df_dim_plant_instructions, df_dim_plant_instruction_categories,
+                                             'instruction_category_id', '_category')
+    df_dim_plant_instructions = df_dim_plant_instructions.rename(columns={'name': 'name_instruction_categories'})
+    catalog.put('plant_instructions', df_dim_plant_instructions[['plant_instruction_id', 'plant_id']])
     df_dim_plant_instructions = df_dim_plant_instructions[['plant_instruction_id', 'name_instruction_categories', 'step_number', 'step_title',
-       'step_description', 'step_image_url', 'additional_tips', 'created_at',
-       'updated_at']]
-    df_dim_plant_instructions.to_csv(os.path.join(final_dir, 'dim_plant_instructions.csv'), index=False)
-    
-    df_fact_plants_data = pd.merge(df_dim_plant_characteristics, df_fact_plants_data, left_on="plant_id", right_on="plant_id", suffixes=('_characteristics', '_fact'))
-    
+                                                           'step_description', 'step_image_url', 'additional_tips', 'created_at',
+                                                           'updated_at']]
+    return {'dim_plant_instructions': df_dim_plant_instructions}
+
+def transform_plant_characteristics(catalog):
+    df_dim_plant_characteristics = catalog.get('dim_plant_characteristics').rename(columns={'id': 'plant_characteristic_id'})
+    catalog.put('plant_characteristics', df_dim_plant_characteristics[['plant_characteristic_id', 'plant_id']])
     df_dim_plant_characteristics = df_dim_plant_characteristics[['plant_characteristic_id', 'height', 'height_unit', 'wide',
                                                                  'wide_unit', 'leaf_color']]
-    df_dim_plant_characteristics.to_csv(os.path.join(final_dir, 'dim_plant_characteristics.csv'), index=False)
-    
-    df_fact_plants_data = df_fact_plants_data[['plant_id', 'plant_faqs_id', 'plant_characteristic_id', 'plant_instruction_id', 'watering_reminders_id']]
-    df_fact_plants_data['total_plants'] = df_fact_plants_data['plant_id'].nunique()
-    df_fact_plants_data.to_csv(os.path.join(final_dir, 'fact_plants_data.csv'), index=False)
+    return {'dim_plant_characteristics': df_dim_plant_characteristics}
 
-def load_to_bigquery(csv_file_path, table_id, **kwargs):
-    # Get environment variables
+def build_fact_plants_data(plant_ids, watering_reminders, plant_faqs, plant_instructions, plant_characteristics):
+    import pandas as pd
+    # Bridge per dimensi: setiap baris menghubungkan satu tanaman ke satu anggota dimensi, sehingga
+    # jumlah baris adalah penjumlahan (bukan perkalian) jumlah reminder, FAQ, instruksi dan karakteristik
+    bridges = [
+        watering_reminders.assign(dimension='watering_reminder'),
+        plant_faqs.assign(dimension='faq'),
+        plant_instructions.assign(dimension='instruction'),
+        plant_characteristics.assign(dimension='characteristic'),
+    ]
+    df_fact_plants_data = pd.concat(bridges, ignore_index=True)
+    df_fact_plants_data = df_fact_plants_data[df_fact_plants_data['plant_id'].isin(plant_ids['plant_id'])]
+    return df_fact_plants_data[['plant_id', 'dimension', 'plant_faqs_id', 'plant_characteristic_id',
+                                'plant_instruction_id', 'watering_reminders_id']].reset_index(drop=True)
+
+def transform_fact_plants_data(catalog):
+    df_fact_plants_data = build_fact_plants_data(
+        catalog.get('plant_ids'), catalog.get('watering_reminders'), catalog.get('plant_faqs'),
+        catalog.get('plant_instructions'), catalog.get('plant_characteristics'))
+    apply_schema(df_fact_plants_data, TARGET_SCHEMAS['fact_plants_data'])
+    df_agg_plants_data = build_activity_counts(
+        df_fact_plants_data, 'plant_id', 'dimension',
+        {'watering_reminder': 'watering_reminder_count', 'faq': 'faq_count',
+         'instruction': 'instruction_count', 'characteristic': 'characteristic_count'})
+    return {'fact_plants_data': df_fact_plants_data, 'agg_plants_data': df_agg_plants_data}
+
+# Urutan step transformasi beserta frame yang dibaca. Kolom None berarti seluruh kolom dibutuhkan,
+# selain itu hanya kolom tersebut yang dibaca dari file staging (frame turunan tidak diproyeksikan).
+# 'provides' adalah frame turunan yang disimpan step lewat catalog.put.
+TRANSFORM_STEPS = [
+    {'name': 'admins', 'func': transform_admins, 'inputs': {'dim_admins': None}},
+    {'name': 'users', 'func': transform_users, 'provides': ['users'], 'inputs': {'dim_users': None}},
+    {'name': 'plants', 'func': transform_plants, 'provides': ['plants'], 'inputs': {
+        'dim_plants': ['id', 'name', 'description', 'is_toxic', 'harvest_duration', 'sunlight', 'planting_time',
+                       'plant_category_id', 'climate_condition', 'additional_tips', 'created_at', 'updated_at']}},
+    {'name': 'my_plants', 'func': transform_my_plants, 'provides': ['my_plant_events'], 'inputs': {
+        'dim_user_plants': ['id', 'user_id', 'plant_id', 'created_at', 'updated_at', 'last_watered_at'],
+        'users': None, 'plants': None}},
+    {'name': 'planting_histories', 'func': transform_planting_histories, 'provides': ['planting_events'], 'inputs': {
+        'dim_user_plant_histories': ['id', 'user_id', 'plant_id', 'plant_name', 'plant_category', 'created_at', 'updated_at'],
+        'users': None}},
+    {'name': 'watering_histories', 'func': transform_watering_histories, 'provides': ['watering_events'], 'inputs': {
+        'dim_watering_histories': ['id', 'user_id', 'plant_id', 'created_at', 'updated_at'],
+        'users': None, 'plants': None}},
+    {'name': 'customize_watering_reminders', 'func': transform_customize_watering_reminders, 'inputs': {
+        'dim_customize_watering_reminders': None}},
+    {'name': 'fact_user_activities', 'func': transform_fact_user_activities, 'inputs': {
+        'my_plant_events': None, 'planting_events': None, 'watering_events': None}},
+    {'name': 'dim_plants', 'func': transform_dim_plants, 'provides': ['plant_ids'], 'inputs': {
+        'plants': None, 'dim_plant_categories': ['id', 'name']}},
+    {'name': 'watering_reminders', 'func': transform_watering_reminders, 'provides': ['watering_reminders'], 'inputs': {
+        'dim_plant_reminders': ['id', 'plant_id', 'watering_frequency', 'each', 'watering_amount', 'unit', 'watering_time',
+                                'weather_condition', 'condition_description', 'created_at', 'updated_at']}},
+    {'name': 'plant_faqs', 'func': transform_plant_faqs, 'provides': ['plant_faqs'], 'inputs': {
+        'dim_plant_faqs': ['id', 'plant_id', 'question', 'answer', 'created_at', 'updated_at']}},
+    {'name': 'plant_instructions', 'func': transform_plant_instructions, 'provides': ['plant_instructions'], 'inputs': {
+        'dim_plant_instructions': ['id', 'plant_id', 'step_number', 'step_title', 'step_description', 'step_image_url',
+                                   'additional_tips', 'created_at', 'updated_at', 'instruction_category_id'],
+        'dim_plant_instruction_categories': ['id', 'name']}},
+    {'name': 'plant_characteristics', 'func': transform_plant_characteristics, 'provides': ['plant_characteristics'], 'inputs': {
+        'dim_plant_characteristics': ['id', 'plant_id', 'height', 'height_unit', 'wide', 'wide_unit', 'leaf_color']}},
+    {'name': 'fact_plants_data', 'func': transform_fact_plants_data, 'inputs': {
+        'watering_reminders': None, 'plant_ids': None, 'plant_faqs': None,
+        'plant_instructions': None, 'plant_characteristics': None}},
+]
+
+# Mode SQL_PUSHDOWN: setiap tabel target adalah satu query atas tabel sumber (file staging dim_{tabel}, hanya
+# kolom di 'inputs' yang dibaca). Tabel target lain di step yang sama bisa dipakai query berikutnya.
+# plant_name mentah dinormalisasi setelah query, sama seperti frame plants di mode pandas. Query dengan join
+# memakai ORDER BY agar urutan baris tetap antar run; UNION ALL tanpa join sudah mempertahankan urutan file
+# (preserve_insertion_order DuckDB), sehingga fact tidak perlu diurutkan ulang.
+PUSHDOWN_STEPS = [
+    {'name': 'admins', 'inputs': {
+        'dim_admins': ['id', 'name', 'email', 'password', 'url_image', 'created_at', 'updated_at']}, 'queries': {
+        'dim_admins': """
+            SELECT id AS admin_id, name AS admin_name, email, password, url_image, created_at, updated_at
+            FROM admins"""}},
+    {'name': 'users', 'inputs': {
+        'dim_users': ['id', 'name', 'email', 'password', 'is_active', 'otp', 'url_image', 'created_at', 'updated_at',
+                      'fcm_token']}, 'queries': {
+        'dim_users': """
+            SELECT id AS user_id, name AS user_name, email, password, is_active, otp, url_image, created_at, updated_at,
+                   fcm_token
+            FROM users"""}},
+    {'name': 'my_plants', 'inputs': {
+        'dim_user_plants': ['id', 'user_id', 'plant_id', 'created_at', 'updated_at', 'last_watered_at'],
+        'dim_users': ['id', 'name'], 'dim_plants': ['id', 'name']}, 'queries': {
+        'dim_my_plants': """
+            SELECT up.id AS my_plant_id, u.name AS user_name, p.name AS plant_name, up.created_at, up.updated_at,
+                   up.last_watered_at
+            FROM user_plants up
+            LEFT JOIN users u ON u.id = up.user_id
+            LEFT JOIN plants p ON p.id = up.plant_id
+            ORDER BY up.id"""}},
+    {'name': 'planting_histories', 'inputs': {
+        'dim_user_plant_histories': ['id', 'user_id', 'plant_name', 'plant_category', 'created_at', 'updated_at'],
+        'dim_users': ['id', 'name']}, 'queries': {
+        'dim_planting_histories': """
+            SELECT h.id AS planting_history_id, u.name AS user_name, h.plant_name, h.plant_category, h.created_at,
+                   h.updated_at
+            FROM user_plant_histories h
+            LEFT JOIN users u ON u.id = h.user_id
+            ORDER BY h.id"""}},
+    {'name': 'watering_histories', 'inputs': {
+        'dim_watering_histories': ['id', 'user_id', 'plant_id', 'created_at', 'updated_at'],
+        'dim_users': ['id', 'name'], 'dim_plants': ['id', 'name']}, 'queries': {
+        'dim_watering_histories': """
+            SELECT w.id AS watering_history_id, u.name AS user_name, p.name AS plant_name, w.created_at, w.updated_at
+            FROM watering_histories w
+            LEFT JOIN users u ON u.id = w.user_id
+            LEFT JOIN plants p ON p.id = w.plant_id
+            ORDER BY w.id"""}},
+    {'name': 'customize_watering_reminders', 'inputs': {
+        'dim_customize_watering_reminders': ['id', 'my_plant_id', 'time', 'recurring', 'type', 'created_at', 'updated_at',
+                                             'user_id', 'plant_id']}, 'queries': {
+        'dim_customize_watering_reminders': """
+            SELECT id AS customize_watering_reminder_id, my_plant_id, "time", recurring, "type", created_at, updated_at,
+                   user_id, plant_id
+            FROM customize_watering_reminders"""}},
+    {'name': 'fact_user_activities', 'inputs': {
+        'dim_user_plants': ['id', 'user_id', 'plant_id', 'created_at'],
+        'dim_user_plant_histories': ['id', 'user_id', 'plant_id', 'created_at'],
+        'dim_watering_histories': ['id', 'user_id', 'plant_id', 'created_at']}, 'queries': {
+        'fact_user_activities': """
+            SELECT 'my_plant' AS activity_type, user_id, plant_id, id AS my_plant_id,
+                   CAST(NULL AS BIGINT) AS planting_history_id, CAST(NULL AS BIGINT) AS watering_history_id, created_at
+            FROM user_plants
+            UNION ALL
+            SELECT 'planting', user_id, plant_id, NULL, id, NULL, created_at FROM user_plant_histories
+            UNION ALL
+            SELECT 'watering', user_id, plant_id, NULL, NULL, id, created_at FROM watering_histories""",
+        'agg_user_activities': """
+            SELECT user_id,
+                   COUNT(*) FILTER (WHERE activity_type = 'my_plant') AS user_plant_count,
+                   COUNT(*) FILTER (WHERE activity_type = 'planting') AS planting_count,
+                   COUNT(*) FILTER (WHERE activity_type = 'watering') AS watering_count
+            FROM fact_user_activities
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+            ORDER BY user_id"""}},
+    {'name': 'dim_plants', 'inputs': {
+        'dim_plants': ['id', 'name', 'description', 'is_toxic', 'harvest_duration', 'sunlight', 'planting_time',
+                       'plant_category_id', 'climate_condition', 'additional_tips', 'created_at', 'updated_at'],
+        'dim_plant_categories': ['id', 'name']}, 'queries': {
+        'dim_plants': """
+            SELECT p.id AS plant_id, p.name AS plant_name, p.description, p.is_toxic, p.harvest_duration, p.sunlight,
+                   p.planting_time, c.name AS plant_category, p.climate_condition, p.additional_tips, p.created_at,
+                   p.updated_at
+            FROM plants p
+            LEFT JOIN plant_categories c ON c.id = p.plant_category_id
+            ORDER BY p.id"""}},
+    {'name': 'watering_reminders', 'inputs': {
+        'dim_plant_reminders': ['id', 'watering_frequency', 'each', 'watering_amount', 'unit', 'watering_time',
+                                'weather_condition', 'condition_description', 'created_at', 'updated_at']}, 'queries': {
+        'dim_watering_reminders': """
+            SELECT id AS watering_reminders_id, watering_frequency, "each", watering_amount, unit, watering_time,
+                   weather_condition, condition_description, created_at, updated_at
+            FROM plant_reminders"""}},
+    {'name': 'plant_faqs', 'inputs': {
+        'dim_plant_faqs': ['id', 'question', 'answer', 'created_at', 'updated_at']}, 'queries': {
+        'dim_plant_faqs': """
+            SELECT id AS plant_faqs_id, question, answer, created_at, updated_at
+            FROM plant_faqs"""}},
+    {'name': 'plant_instructions', 'inputs': {
+        'dim_plant_instructions': ['id', 'step_number', 'step_title', 'step_description', 'step_image_url',
+                                   'additional_tips', 'created_at', 'updated_at', 'instruction_category_id'],
+        'dim_plant_instruction_categories': ['id', 'name']}, 'queries': {
+        'dim_plant_instructions': """
+            SELECT i.id AS plant_instruction_id, c.name AS name_instruction_categories, i.step_number, i.step_title,
+                   i.step_description, i.step_image_url, i.additional_tips, i.created_at, i.updated_at
+            FROM plant_instructions i
+            LEFT JOIN plant_instruction_categories c ON c.id = i.instruction_category_id
+            ORDER BY i.id"""}},
+    {'name': 'plant_characteristics', 'inputs': {
+        'dim_plant_characteristics': ['id', 'height', 'height_unit', 'wide', 'wide_unit', 'leaf_color']}, 'queries': {
+        'dim_plant_characteristics': """
+            SELECT id AS plant_characteristic_id, height, height_unit, wide, wide_unit, leaf_color
+            FROM plant_characteristics"""}},
+    {'name': 'fact_plants_data', 'inputs': {
+        'dim_plants': ['id'], 'dim_plant_reminders': ['id', 'plant_id'], 'dim_plant_faqs': ['id', 'plant_id'],
+        'dim_plant_instructions': ['id', 'plant_id'], 'dim_plant_characteristics': ['id', 'plant_id']}, 'queries': {
+        'fact_plants_data': """
+            SELECT plant_id, dimension, plant_faqs_id, plant_characteristic_id, plant_instruction_id, watering_reminders_id
+            FROM (
+                SELECT plant_id, 'watering_reminder' AS dimension, CAST(NULL AS BIGINT) AS plant_faqs_id,
+                       CAST(NULL AS BIGINT) AS plant_characteristic_id, CAST(NULL AS BIGINT) AS plant_instruction_id,
+                       id AS watering_reminders_id
+                FROM plant_reminders
+                UNION ALL
+                SELECT plant_id, 'faq', id, NULL, NULL, NULL FROM plant_faqs
+                UNION ALL
+                SELECT plant_id, 'instruction', NULL, NULL, id, NULL FROM plant_instructions
+                UNION ALL
+                SELECT plant_id, 'characteristic', NULL, id, NULL, NULL FROM plant_characteristics
+            )
+            WHERE plant_id IN (SELECT id FROM plants)
+            ORDER BY watering_reminders_id NULLS LAST, plant_faqs_id NULLS LAST, plant_instruction_id NULLS LAST,
+                     plant_characteristic_id""",
+        'agg_plants_data': """
+            SELECT plant_id,
+                   COUNT(*) FILTER (WHERE dimension = 'watering_reminder') AS watering_reminder_count,
+                   COUNT(*) FILTER (WHERE dimension = 'faq') AS faq_count,
+                   COUNT(*) FILTER (WHERE dimension = 'instruction') AS instruction_count,
+                   COUNT(*) FILTER (WHERE dimension = 'characteristic') AS characteristic_count
+            FROM fact_plants_data
+            GROUP BY plant_id
+            ORDER BY plant_id"""}},
+]
+
+def compact_text_columns(table):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    # Kolom teks hasil query langsung diberi bentuk akhir compact_dtypes di Arrow: dictionary (category) jika
+    # rasio nilai unik tidak melebihi CATEGORY_MAX_RATIO, selain itu string biasa. ENUM DuckDB (dari frame
+    # category yang didaftarkan) juga dictionary, tetapi indeksnya unsigned sehingga selalu di-encode ulang.
+    columns = []
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        if pa.types.is_string(column.type) and pc.count_distinct(column).as_py() <= CATEGORY_MAX_RATIO * len(column):
+            column = column.dictionary_encode()
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+def run_pushdown_step(catalog, step):
+    import pandas as pd
+    import pyarrow as pa
+    # Join dan proyeksi dikerjakan DuckDB; pandas hanya menerima hasil akhir setiap tabel target
+    types = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}
+    connection = catalog.sql()
+    try:
+        rows_in = sum(catalog.register(name) for name in step['inputs'])
+        outputs = {}
+        for table_name, query in step['queries'].items():
+            result = connection.execute(query).arrow()
+            # Hasil Arrow didaftarkan dengan nama tabel target tanpa disalin, untuk query berikutnya di step ini
+            connection.register(table_name, result)
+            df = naive_timestamps(compact_text_columns(result).to_pandas(types_mapper=types.get))
+            if 'plant_key' in TARGET_SCHEMAS[table_name]['columns']:
+                df = normalize_plant_names(df)[list(TARGET_SCHEMAS[table_name]['columns'])]
+            outputs[table_name] = df
+    finally:
+        # Input dan hasil step ini dilepas sebelum step berikutnya
+        for name in step['inputs']:
+            connection.unregister(name[len('dim_'):])
+        for table_name in step['queries']:
+            connection.unregister(table_name)
+    return outputs, rows_in
+
+def transform_steps():
+    return PUSHDOWN_STEPS if SQL_PUSHDOWN == 'duckdb' else TRANSFORM_STEPS
+
+def transform_step_keys(steps, directory):
+    # Kunci step = hash dari versi pipeline, schema, dan fingerprint setiap input. Input file memakai
+    # hash file staging; frame turunan memakai kunci step penghasilnya, sehingga perubahan ikut menjalar.
+    config = hash_values(PIPELINE_VERSION, STAGING_FORMAT, SOURCE_SCHEMAS, TARGET_SCHEMAS)
+    frame_fingerprints = {}
+    keys = {}
+    for step in steps:
+        inputs = {}
+        for name, columns in step['inputs'].items():
+            if name not in frame_fingerprints:
+                path = staged_path(directory, name)
+                frame_fingerprints[name] = file_fingerprint('extract', name[len('dim_'):], path) if os.path.exists(path) else None
+            inputs[name] = [frame_fingerprints[name], columns]
+        keys[step['name']] = hash_values(config, step['name'], inputs, step.get('queries'))
+        for name in step.get('provides', []):
+            frame_fingerprints[name] = hash_values(keys[step['name']], name)
+    return keys
+
+def plan_transform_steps(steps, step_keys, final_dir):
+    # Step dilewati jika kuncinya sama dengan run sebelumnya dan semua outputnya masih ada, kecuali
+    # frame turunannya dibutuhkan step lain yang tetap dijalankan (ditelusuri dari step terakhir)
+    needed = set()
+    planned = []
+    for step in reversed(steps):
+        previous = read_fingerprint('transform', step['name'])
+        unchanged = (previous is not None and previous['key'] == step_keys[step['name']] and not force_refresh(step['name'])
+                     and all(os.path.exists(staged_path(final_dir, table_name)) for table_name in previous['outputs']))
+        if not unchanged or needed.intersection(step.get('provides', [])):
+            planned.insert(0, step)
+            needed.update(step['inputs'])
+    return planned
+
+def transform_task():
+    # Define directory paths
+    output_dir = OUTPUT_DIR
+    dim_dir = DIM_DIR
+    final_dir = FINAL_DIR
+
+    # Create directories if they do not exist
+    create_directory_if_not_exists(output_dir)
+    create_directory_if_not_exists(dim_dir)
+    create_directory_if_not_exists(final_dir)
+
+    all_steps = transform_steps()
+    step_keys = transform_step_keys(all_steps, dim_dir)
+    steps = plan_transform_steps(all_steps, step_keys, final_dir)
+    skipped = [step['name'] for step in all_steps if step not in steps]
+    catalog = DataFrameCatalog(dim_dir, steps)
+    for step in all_steps:
+        if step in steps:
+            print(f"Menjalankan transformasi {step['name']}...")
+            with measure('transform', step['name']) as metric:
+                if 'queries' in step:
+                    outputs, metric['rows_in'] = run_pushdown_step(catalog, step)
+                else:
+                    outputs = step['func'](catalog)
+                    metric['rows_in'] = sum(len(catalog.frames[name]) for name in step['inputs'] if name in catalog.frames)
+                metric['rows_out'] = 0
+                metric['bytes'] = 0
+                for table_name, df in outputs.items():
+                    # Setiap tabel output divalidasi dan diberi tipe sesuai TARGET_SCHEMAS sebelum ditulis
+                    df = optimize_dtypes(table_name, check_schema_drift(table_name, df, TARGET_SCHEMAS[table_name]),
+                                         TARGET_SCHEMAS[table_name])
+                    write_staged(df, staged_path(final_dir, table_name))
+                    fingerprint = record_file_fingerprint('output', table_name, staged_path(final_dir, table_name))
+                    metric['rows_out'] += len(df)
+                    metric['bytes'] += fingerprint['size']
+                    print(f"Saved {len(df)} rows to {staged_path(final_dir, table_name)}")
+            write_fingerprint('transform', step['name'], {'key': step_keys[step['name']], 'outputs': list(outputs)})
+            for name in step['inputs']:
+                catalog.consumed(name)
+    catalog.close()
+    if skipped:
+        print(f"Input tidak berubah, transformasi dilewati: {', '.join(skipped)}")
+    report_metrics('transform_task')
+
+# Client BigQuery dibuat sekali per proses worker dan dipakai ulang oleh semua load,
+# sehingga credentials dan HTTP session (connection pool) tidak dibangun ulang per tabel
+_bigquery_client = None
+_bigquery_client_factory = None
+_bigquery_client_lock = threading.Lock()
+
+def create_bigquery_client():
+    from google.cloud import bigquery
+    from google.oauth2 import service_account
     project_id = os.getenv('PROJECT_ID')
-    dataset_id = os.getenv('DATASET_ID')
     service_acc = os.getenv('SERVICE_ACCOUNT')
+    credentials = service_account.Credentials.from_service_account_file(service_acc)
+    return bigquery.Client(credentials=credentials, project=project_id)
 
-    # Set service account environment variable
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = service_acc
+class LocalJob:
+    # Job yang sudah selesai saat dibuat, dengan atribut yang dibaca load_to_bigquery dan load_all_to_bigquery
+    def __init__(self, output_rows, num_dml_affected_rows=None):
+        self.output_rows = output_rows
+        self.num_dml_affected_rows = num_dml_affected_rows
+        self.errors = None
+        self.state = 'DONE'
 
-    # Initialize BigQuery client
-    credentials = service_account.Credentials.from_service_account_file(service_acc)
-    client = bigquery.Client(credentials=credentials, project=project_id)
+    def done(self):
+        return True
 
-    # Read CSV file into DataFrame
-    df = pd.read_csv(csv_file_path)
+    def result(self, timeout=None):
+        return self
 
-    # Initialize an empty schema list
-    schema = []
+class DuckDBClient:
+    # Pengganti client BigQuery untuk SINK=duckdb: load job dan query dijalankan pada file DuckDB lokal.
+    # Tabel `project.dataset.tabel` disimpan dengan nama tabelnya saja.
+    def __init__(self, path=None):
+        import duckdb
+        self.path = path or DUCKDB_PATH
+        create_directory_if_not_exists(os.path.dirname(os.path.abspath(self.path)))
+        self.connection = duckdb.connect(self.path)
+        self.project = 'local'
 
-    # Convert created_at and updated_at columns to datetime if they exist
-    if 'created_at' in df.columns:
-        df['created_at'] = pd.to_datetime(df['created_at'], format='%Y-%m-%d %H:%M:%S.%f', errors='coerce')
-        schema.append(bigquery.SchemaField("created_at", "TIMESTAMP"))
-    if 'updated_at' in df.columns:
-        df['updated_at'] = pd.to_datetime(df['updated_at'], format='%Y-%m-%d %H:%M:%S.%f', errors='coerce')
-        schema.append(bigquery.SchemaField("updated_at", "TIMESTAMP"))
+    def load_arrow(self, table, table_id, job_config=None):
+        import pyarrow as pa
+        # Tipe kolom mengikuti schema BigQuery di job_config (INT64, STRING, ...), bukan dtype hasil compact_dtypes;
+        # tanpa schema, kolom category (dictionary) tetap disimpan sebagai teks biasa
+        arrow_types = {'INT64': pa.int64(), 'FLOAT64': pa.float64(), 'BOOL': pa.bool_(), 'STRING': pa.string(),
+                       'TIMESTAMP': pa.timestamp('us')}
+        schema_types = {field.name: arrow_types[field.field_type] for field in getattr(job_config, 'schema', None) or []}
+        columns = []
+        for name, column in zip(table.column_names, table.columns):
+            if name in schema_types:
+                column = column.cast(schema_types[name])
+            elif pa.types.is_dictionary(column.type):
+                column = column.cast(column.type.value_type)
+            columns.append(column)
+        table = pa.Table.from_arrays(columns, names=table.column_names)
+        # Setiap cursor adalah koneksi terpisah ke database yang sama, aman dipakai dari thread load paralel.
+        # Semua load di pipeline ini memakai WRITE_TRUNCATE, jadi tabel selalu dibuat ulang.
+        cursor = self.connection.cursor()
+        try:
+            cursor.register('load_source', table)
+            cursor.execute(f'CREATE OR REPLACE TABLE "{table_id.rsplit(".", 1)[-1]}" AS SELECT * FROM load_source')
+        finally:
+            cursor.close()
+        return LocalJob(table.num_rows)
 
-    # Add other schema fields as necessary
-    for column in df.columns:
-        if column not in ['created_at', 'updated_at']:
-            dtype = df[column].dtype
-            if pd.api.types.is_integer_dtype(dtype):
-                schema.append(bigquery.SchemaField(column, "INT64"))
-            elif pd.api.types.is_float_dtype(dtype):
-                schema.append(bigquery.SchemaField(column, "FLOAT64"))
-            elif pd.api.types.is_bool_dtype(dtype):
-                schema.append(bigquery.SchemaField(column, "BOOL"))
-            elif pd.api.types.is_datetime64_any_dtype(dtype):
-                schema.append(bigquery.SchemaField(column, "TIMESTAMP"))
-            else:
-                schema.append(bigquery.SchemaField(column, "STRING"))
+    def load_table_from_file(self, file_obj, table_id, job_config=None, **kwargs):
+        import pyarrow.parquet as pq
+        return self.load_arrow(pq.read_table(file_obj), table_id, job_config)
+
+    def load_table_from_dataframe(self, dataframe, table_id, job_config=None, **kwargs):
+        import pyarrow as pa
+        return self.load_arrow(pa.Table.from_pandas(dataframe, preserve_index=False), table_id, job_config)
+
+    def query(self, query, job_config=None, **kwargs):
+        # Nama `project.dataset.tabel` diganti "tabel"; MERGE dari LOAD_STRATEGY=merge butuh DuckDB 1.4 ke atas
+        query = re.sub(r"`(?:[^`]*\.)?([^`.]+)`", r'"\1"', query)
+        cursor = self.connection.cursor()
+        try:
+            row = cursor.execute(query).fetchone()
+        finally:
+            cursor.close()
+        return LocalJob(0, row[0] if row else 0)
+
+def resolve_bigquery_client_factory():
+    # BIGQUERY_CLIENT_FACTORY="modul:fungsi" mengganti client asli, misalnya stand-in lokal untuk benchmark
+    if _bigquery_client_factory is not None:
+        return _bigquery_client_factory
+    factory_path = os.getenv('BIGQUERY_CLIENT_FACTORY')
+    if factory_path:
+        module_name, _, attribute = factory_path.partition(':')
+        return getattr(importlib.import_module(module_name), attribute)
+    if SINK == 'duckdb':
+        return DuckDBClient
+    return create_bigquery_client
+
+def set_bigquery_client_factory(factory):
+    global _bigquery_client, _bigquery_client_factory
+    with _bigquery_client_lock:
+        _bigquery_client_factory = factory
+        _bigquery_client = None
+
+def get_bigquery_client():
+    global _bigquery_client
+    with _bigquery_client_lock:
+        if _bigquery_client is None:
+            _bigquery_client = resolve_bigquery_client_factory()()
+        return _bigquery_client
+
+def bigquery_schema_for(table_name):
+    from google.cloud import bigquery
+    if table_name not in TARGET_SCHEMAS:
+        raise ValueError(f"Tabel {table_name} tidak terdaftar di TARGET_SCHEMAS")
+    schema = TARGET_SCHEMAS[table_name]
+    return [
+        bigquery.SchemaField(column, SCHEMA_TYPES[column_type]['bigquery'],
+                             mode='REQUIRED' if column in schema.get('required', []) else 'NULLABLE')
+        for column, column_type in schema['columns'].items()
+    ]
+
+def full_table_id(table_id):
+    # Get environment variables
+    project_id = os.getenv('PROJECT_ID')
+    dataset_id = os.getenv('DATASET_ID')
 
     # Define full table ID: project_id.dataset_id.table_id
-    table_id = f"{project_id}.{dataset_id}.{table_id}"
+    return f"{project_id}.{dataset_id}.{table_id}"
+
+def apply_table_layout(job_config, table_name):
+    from google.cloud import bigquery
+    # Partisi dan clustering hanya berlaku saat tabel dibuat atau ditulis ulang penuh
+    layout = TABLE_LAYOUTS.get(table_name)
+    if layout is None:
+        return job_config
+    if layout.get('partition'):
+        job_config.time_partitioning = bigquery.TimePartitioning(
+            type_=layout.get('partition_type', bigquery.TimePartitioningType.DAY),
+            field=layout['partition'],
+        )
+    if layout.get('cluster'):
+        job_config.clustering_fields = layout['cluster']
+    return job_config
+
+def submit_full_load(client, file_path, table_name):
+    from google.cloud import bigquery
+    table_id = full_table_id(table_name)
+
+    schema = bigquery_schema_for(table_name)
+
+    # Parquet dikirim langsung tanpa parsing ke DataFrame
+    if staging_format_of(file_path) == 'parquet':
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition="WRITE_TRUNCATE",
+            schema=schema,
+        )
+        apply_table_layout(job_config, table_name)
+        with open(file_path, 'rb') as f:
+            return client.load_table_from_file(f, table_id, job_config=job_config)
+
+    # Read staged file into DataFrame, tipe kolom dan tanggal dari registry
+    df = read_staged(file_path, schema=TARGET_SCHEMAS[table_name])
 
-    # Load DataFrame into BigQuery table with schema if it exists
-    job_config = bigquery.LoadJobConfig(write_disposition="WRITE_TRUNCATE")
-    if schema:
-        job_config.schema = schema
+    # Load DataFrame into BigQuery table with schema from the registry
+    job_config = bigquery.LoadJobConfig(write_disposition="WRITE_TRUNCATE", schema=schema)
+    apply_table_layout(job_config, table_name)
 
-    job = client.load_table_from_dataframe(df, table_id, job_config=job_config)
+    return client.load_table_from_dataframe(df, table_id, job_config=job_config)
 
-    # Wait for job to complete
-    job.result()
+def load_key_columns(table_name, columns):
+    if table_name in LOAD_KEYS:
+        return LOAD_KEYS[table_name]
+    if columns and columns[0].endswith('_id'):
+        return [columns[0]]
+    return None
 
-    print(f"Loaded {len(df)} rows into {table_id}.")
+def compute_row_hashes(df, keys):
+    import pandas as pd
+    # Satu hash per baris untuk seluruh kolom; kunci disimpan sebagai nilai biasa (bukan category).
+    # Lebar integer hasil compact_dtypes bisa berbeda antar run, jadi integer diseragamkan ke Int64 dulu.
+    normalized = df.copy()
+    for column in normalized.columns:
+        if isinstance(normalized[column].dtype, pd.CategoricalDtype):
+            normalized[column] = normalized[column].astype(normalized[column].cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(normalized[column]):
+            normalized[column] = normalized[column].astype('Int64')
+    state = normalized[keys].copy()
+    state['_row_hash'] = pd.util.hash_pandas_object(normalized, index=False).values
+    return state
+
+def load_state_path(table_name):
+    return os.path.join(LOAD_STATE_DIR, f"{table_name}.parquet")
+
+def read_load_state(table_name, columns):
+    import pyarrow.parquet as pq
+    path = load_state_path(table_name)
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    # Kolom berubah berarti baris lama tidak bisa dibandingkan, tabel dimuat ulang penuh
+    if json.loads(table.schema.metadata[b'columns']) != list(columns):
+        return None
+    return table.to_pandas()
+
+def write_pending_load_state(table_name, state, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    create_directory_if_not_exists(LOAD_STATE_DIR)
+    table = pa.Table.from_pandas(state, preserve_index=False)
+    table = table.replace_schema_metadata({'columns': json.dumps(list(columns))})
+    pq.write_table(table, f"{load_state_path(table_name)}.pending")
+
+def commit_load_state(table_name):
+    # Hash baru hanya dipakai setelah job load berhasil
+    pending_path = f"{load_state_path(table_name)}.pending"
+    if os.path.exists(pending_path):
+        os.replace(pending_path, load_state_path(table_name))
+
+def diff_load_state(state, previous, keys):
+    previous = previous.astype(state[keys].dtypes.to_dict())
+    compared = state.merge(previous, on=keys, how='outer', suffixes=('', '_previous'), indicator=True)
+    changed = (compared['_merge'] == 'left_only') | (
+        (compared['_merge'] == 'both') & (compared['_row_hash'] != compared['_row_hash_previous'])
+    )
+    changed_keys = compared.loc[changed, keys]
+    deleted_keys = compared.loc[compared['_merge'] == 'right_only', keys]
+    return changed_keys, deleted_keys
+
+def build_merge_query(target_id, staging_id, columns, keys):
+    # Kunci boleh NULL (misalnya id aktivitas lain di fact_user_activities), sehingga dibandingkan null-safe
+    condition = ' AND '.join(f"T.`{key}` IS NOT DISTINCT FROM S.`{key}`" for key in keys)
+    updates = ', '.join(f"`{column}` = S.`{column}`" for column in columns if column not in keys)
+    inserted = ', '.join(f"`{column}`" for column in columns)
+    values = ', '.join(f"S.`{column}`" for column in columns)
+    query = f"MERGE `{target_id}` T USING `{staging_id}` S ON {condition}\n"
+    query += "WHEN MATCHED AND S._deleted THEN DELETE\n"
+    if updates:
+        query += f"WHEN MATCHED THEN UPDATE SET {updates}\n"
+    query += f"WHEN NOT MATCHED AND NOT S._deleted THEN INSERT ({inserted}) VALUES ({values})"
+    return query
+
+def submit_merge_load(client, file_path, table_name):
+    from google.cloud import bigquery
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    df = read_staged(file_path, schema=TARGET_SCHEMAS.get(table_name))
+    columns = list(df.columns)
+    keys = load_key_columns(table_name, columns)
+    if keys is None or df.duplicated(keys).any():
+        print(f"{table_name} tidak punya kunci unik, dimuat ulang penuh")
+        return submit_full_load(client, file_path, table_name)
+
+    state = compute_row_hashes(df, keys)
+    previous = read_load_state(table_name, columns)
+    write_pending_load_state(table_name, state, columns)
+    if previous is None:
+        print(f"Belum ada state load untuk {table_name}, dimuat ulang penuh")
+        return submit_full_load(client, file_path, table_name)
+
+    changed_keys, deleted_keys = diff_load_state(state, previous, keys)
+    print(f"{table_name}: {len(changed_keys)} baris berubah, {len(deleted_keys)} baris dihapus dari {len(df)} baris")
+    if changed_keys.empty and deleted_keys.empty:
+        return None
+
+    # Hanya delta yang diunggah ke tabel staging, baris terhapus ikut sebagai kunci dengan _deleted = TRUE
+    delta = df.merge(changed_keys.astype(df[keys].dtypes.to_dict()), on=keys)
+    delta['_deleted'] = False
+    deleted = deleted_keys.copy()
+    deleted['_deleted'] = True
+    delta_table = pa.Table.from_pandas(delta, preserve_index=False)
+    delta_table = delta_table.cast(utc_timestamp_schema(delta_table.schema))
+    deleted_table = pa.Table.from_arrays([
+        pa.array(deleted[field.name], type=field.type) if field.name in deleted.columns else pa.nulls(len(deleted), type=field.type)
+        for field in delta_table.schema
+    ], schema=delta_table.schema)
+    staged = pa.concat_tables([delta_table, deleted_table])
+    buffer = pa.BufferOutputStream()
+    pq.write_table(staged, buffer, coerce_timestamps='us', allow_truncated_timestamps=True)
+
+    staging_id = full_table_id(f"{table_name}__staging")
+    # Tipe kolom staging diambil dari registry, bukan dideteksi dari Parquet, agar MERGE ke tabel tujuan cocok.
+    # Semua kolom NULLABLE karena baris terhapus hanya berisi kunci.
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition="WRITE_TRUNCATE",
+        schema=[bigquery.SchemaField(field.name, field.field_type) for field in bigquery_schema_for(table_name)]
+        + [bigquery.SchemaField('_deleted', 'BOOL')],
+    )
+    client.load_table_from_file(pa.BufferReader(buffer.getvalue()), staging_id, job_config=job_config).result()
+
+    return client.query(build_merge_query(full_table_id(table_name), staging_id, columns, keys))
+
+def load_fingerprint(file_path, table_name):
+    # Load diulang jika isi file, strategi, layout, schema, atau tujuan (sink dan dataset) berubah
+    sink = DUCKDB_PATH if SINK == 'duckdb' else SINK
+    return hash_values(PIPELINE_VERSION, LOAD_STRATEGY, TABLE_LAYOUTS.get(table_name), TARGET_SCHEMAS.get(table_name), sink,
+                       os.getenv('PROJECT_ID'), os.getenv('DATASET_ID'), file_fingerprint('output', table_name, file_path))
+
+def finish_load(table_name, file_path):
+    commit_load_state(table_name)
+    write_fingerprint('load', table_name, {'key': load_fingerprint(file_path, table_name)})
+
+def submit_load_job(client, file_path, table_id):
+    previous = read_fingerprint('load', table_id)
+    if previous is not None and previous['key'] == load_fingerprint(file_path, table_id) and not force_refresh(table_id):
+        return None
+    if LOAD_STRATEGY == 'merge':
+        return submit_merge_load(client, file_path, table_id)
+    return submit_full_load(client, file_path, table_id)
+
+def job_row_count(job):
+    # Query MERGE melaporkan baris yang terdampak, load job melaporkan baris yang dimuat
+    rows = getattr(job, 'num_dml_affected_rows', None)
+    return rows if rows is not None else job.output_rows
+
+def load_to_bigquery(file_path, table_id, **kwargs):
+    with measure('load', table_id) as metric:
+        metric['bytes'] = os.path.getsize(file_path)
+        job = submit_load_job(get_bigquery_client(), file_path, table_id)
+        if job is None:
+            finish_load(table_id, file_path)
+            metric['rows_out'] = 0
+            print(f"Tidak ada perubahan untuk {table_id}, load dilewati.")
+        else:
+            # Wait for job to complete
+            job.result()
+            finish_load(table_id, file_path)
+            metric['rows_out'] = job_row_count(job)
+            print(f"Loaded {job_row_count(job)} rows into {table_id}.")
+    report_metrics(f"load_{table_id}")
+
+def load_manifest(load_dir):
+    # Daftar tabel load diambil dari TARGET_SCHEMAS, bukan dari isi direktori saat DAG di-parse
+    return {table_name: staged_path(load_dir, table_name) for table_name in TARGET_SCHEMAS}
+
+def load_all_to_bigquery(load_dir=None, **kwargs):
+    # Semua load job dikirim sekaligus lalu dipantau bersamaan; BigQuery menjalankannya paralel,
+    # sehingga durasi tahap load mendekati job paling lambat ditambah waktu upload
+    client = get_bigquery_client()
+    files = load_manifest(load_dir or FINAL_DIR)
+    start = time.perf_counter()
+    report = {}
+    jobs = {}
+    with ThreadPoolExecutor(max_workers=max(LOAD_PARALLELISM, 1)) as executor:
+        futures = {executor.submit(submit_load_job, client, path, table): table for table, path in files.items()}
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                jobs[table] = future.result()
+            except Exception as error:
+                report[table] = {'status': 'GAGAL', 'rows': 0, 'seconds': time.perf_counter() - start, 'error': str(error)}
+    print(f"{len(jobs)} load job dikirim dalam {time.perf_counter() - start:.3f} detik")
+
+    for table, job in list(jobs.items()):
+        if job is None:
+            del jobs[table]
+            finish_load(table, files[table])
+            report[table] = {'status': 'TIDAK BERUBAH', 'rows': 0, 'seconds': time.perf_counter() - start, 'error': None}
+
+    while jobs:
+        for table, job in list(jobs.items()):
+            if not job.done():
+                continue
+            del jobs[table]
+            try:
+                job.result()
+                finish_load(table, files[table])
+                report[table] = {'status': 'OK', 'rows': job_row_count(job), 'seconds': time.perf_counter() - start, 'error': None}
+            except Exception as error:
+                report[table] = {'status': 'GAGAL', 'rows': 0, 'seconds': time.perf_counter() - start, 'error': str(error)}
+        if jobs:
+            time.sleep(LOAD_POLL_INTERVAL)
+
+    print("Laporan load ke BigQuery:")
+    for table, result in sorted(report.items()):
+        print(f"  {table}: {result['status']}, {result['rows']} baris, selesai {result['seconds']:.3f} detik"
+              + (f", error: {result['error']}" if result['error'] else ""))
+    print(f"Total waktu load {len(report)} tabel: {time.perf_counter() - start:.3f} detik")
+
+    # Job dipantau bersama, jadi waktu per tabel dihitung dari awal pengiriman sampai job selesai
+    for table, result in report.items():
+        record_metric({'stage': 'load', 'name': table, 'rows_in': None, 'rows_out': result['rows'],
+                       'bytes': os.path.getsize(files[table]) if os.path.exists(files[table]) else None,
+                       'status': 'ok' if result['status'] != 'GAGAL' else 'error',
+                       'wall_seconds': round(result['seconds'], 6), 'cpu_seconds': None,
+                       'rss_bytes': current_rss(), 'rss_delta_bytes': None})
+    report_metrics('load_all_to_bigquery')
+
+    failed = [table for table, result in report.items() if result['status'] == 'GAGAL']
+    if failed:
+        raise RuntimeError(f"Load ke BigQuery gagal untuk tabel: {', '.join(sorted(failed))}")
+    return report
 
 # Define the tasks
 extract_task = PythonOperator(
@@ -372,25 +2055,32 @@ transform_task = PythonOperator(
     dag=dag,
 )
 
-data_source_dir = '/home/newrey/airflow/Capstone-Project-Plantopia/data_source_to_load'
+data_source_dir = FINAL_DIR
 
-# List to hold tasks for loading CSV files to BigQuery
+# List to hold tasks for loading staged files to BigQuery
 load_tasks = []
 
 # Chain tasks together: extract_task >> transform_task
 extract_task >> transform_task
 
-# Iterate over CSV files in data source directory
-for csv_file in os.listdir(data_source_dir):
-    if csv_file.endswith('.csv'):
-        csv_file_path = os.path.join(data_source_dir, csv_file)
-        table_name = os.path.splitext(csv_file)[0]  # Table name taken from file name without extension
-
+if LOAD_MODE == 'bulk':
+    # Satu task untuk seluruh tabel: satu kali startup worker dan client, job dipantau bersamaan
+    load_task = PythonOperator(
+        task_id='load_all_to_bigquery',
+        python_callable=load_all_to_bigquery,
+        op_kwargs={'load_dir': data_source_dir},
+        dag=dag,
+    )
+    transform_task >> load_task
+    load_tasks.append(load_task)
+else:
+    # Satu task per tabel di manifest; file staging-nya baru dibaca saat task berjalan
+    for table_name, file_path in load_manifest(data_source_dir).items():
         # Task: load_{table_name}_to_bigquery
         load_task = PythonOperator(
             task_id=f'load_{table_name}_to_bigquery',
             python_callable=load_to_bigquery,
-            op_kwargs={'csv_file_path': csv_file_path, 'table_id': table_name},
+            op_kwargs={'file_path': file_path, 'table_id': table_name},
             provide_context=True,
             dag=dag,
         )
@@ -399,4 +2089,11 @@ for csv_file in os.listdir(data_source_dir):
         transform_task >> load_task
 
         # Add load_task to load_tasks list
-        load_tasks.append(load_task)
\ No newline at end of file
+        load_tasks.append(load_task)
+
+if __name__ == '__main__':
+    # Mode lokal tanpa scheduler: extract, transform dan load dijalankan berurutan di proses ini, misalnya
+    # PIPELINE_BASE_DIR=/tmp/plantopia SOURCE=csv SOURCE_PATH=data_source_csv SINK=duckdb python dags/ETL_Capstone-Project-Plantopia.py
+    extract_task.python_callable()
+    transform_task.python_callable()
+    load_all_to_bigquery(data_source_dir)
\ No newline at end of file
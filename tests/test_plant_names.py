@@ -0,0 +1,35 @@
+import importlib.util
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('airflow')
+
+DAG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'ETL_Capstone-Project-Plantopia.py')
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    # Nama file DAG mengandung tanda '-', sehingga dimuat lewat importlib, bukan import biasa
+    spec = importlib.util.spec_from_file_location('plantopia_etl', DAG_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_null_plant_name_gets_null_key(pipeline):
+    df = pd.DataFrame({'id': [1, 2, 3, 4], 'plant_name': ['Lavender - Ungu', None, 'lavender', None]})
+    # Cleansing mengubah nama NULL menjadi '-' sebelum normalisasi, seperti di extract
+    df = pipeline.normalize_plant_names(pipeline.fill_missing_values(df))
+
+    assert df['plant_name'].isna().tolist() == [False, True, False, True]
+    assert df['plant_key'].isna().tolist() == [False, True, False, True]
+    assert df['plant_key'][0] == df['plant_key'][2] == pipeline.plant_key('Lavender')
+
+
+def test_plant_name_dash_only_gets_null_key(pipeline):
+    df = pipeline.normalize_plant_names(pd.DataFrame({'plant_name': ['-', ' - ', 'Rafflesia']}))
+
+    assert df['plant_name'].isna().tolist() == [True, True, False]
+    assert df['plant_key'].isna().tolist() == [True, True, False]